@@ -0,0 +1,111 @@
+import hashlib
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+
+from app.helpers.retriever import normalize_question
+
+
+class AnswerCache:
+    """
+    Persistent cache of final answers keyed by (document content hash,
+    normalized question, prompt/model version). Entries expire after
+    ttl seconds and the least recently used ones are evicted past
+    max_entries. Question embeddings are stored too, so a near-duplicate
+    question can reuse an answer when its cosine similarity clears a
+    threshold.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, evict_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._puts = 0
+        with self._connect() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, doc_hash TEXT NOT NULL, version TEXT NOT NULL,"
+                " question TEXT NOT NULL, answer TEXT NOT NULL, embedding BLOB,"
+                " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_doc ON answers (doc_hash, version)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return closing(conn)
+
+    @staticmethod
+    def key(doc_hash: str, question: str, version: str) -> str:
+        raw = f"{doc_hash}\0{version}\0{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, doc_hash: str, questions: list[str], version: str) -> dict:
+        """Returns {position: answer} for the questions with a fresh cached answer."""
+        if not questions:
+            return {}
+        keys = [self.key(doc_hash, q, version) for q in questions]
+        now = time.time()
+        with self._connect() as conn, conn:
+            placeholders = ",".join("?" * len(keys))
+            rows = dict(conn.execute(
+                f"SELECT key, answer FROM answers WHERE key IN ({placeholders}) AND created_at > ?",
+                (*keys, now - self.ttl),
+            ).fetchall())
+            if rows:
+                conn.executemany("UPDATE answers SET last_used = ? WHERE key = ?", ((now, k) for k in rows))
+        return {i: rows[k] for i, k in enumerate(keys) if k in rows}
+
+    def get_similar(self, doc_hash: str, version: str, vectors: np.ndarray, threshold: float) -> dict:
+        """
+        Near-duplicate lookup: {position: answer} for query vectors whose best
+        cosine similarity to a cached question of this document is >= threshold.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT answer, embedding FROM answers"
+                " WHERE doc_hash = ? AND version = ? AND embedding IS NOT NULL AND created_at > ?",
+                (doc_hash, version, time.time() - self.ttl),
+            ).fetchall()
+        if not rows:
+            return {}
+        cached = np.vstack([np.frombuffer(row[1], dtype="float32") for row in rows])
+        cached /= np.linalg.norm(cached, axis=1, keepdims=True) + 1e-12
+        queries = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        similarity = queries @ cached.T
+        best = similarity.argmax(axis=1)
+        return {
+            i: rows[j][0] for i, j in enumerate(best.tolist()) if similarity[i, j] >= threshold
+        }
+
+    def put_many(self, doc_hash: str, version: str, questions: list[str], answers: list[str], vectors=None):
+        now = time.time()
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO answers"
+                " (key, doc_hash, version, question, answer, embedding, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        self.key(doc_hash, q, version), doc_hash, version, normalize_question(q), a,
+                        None if vectors is None else np.asarray(vectors[i], dtype="float32").tobytes(),
+                        now, now,
+                    )
+                    for i, (q, a) in enumerate(zip(questions, answers))
+                ),
+            )
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM answers WHERE created_at <= ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM answers WHERE key IN ("
+            " SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
@@ -1,47 +1,172 @@
 import os
-import pickle
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from app.helpers.memory_cache import LRUCache
+from app.helpers.metrics import memory_cache_bytes, memory_cache_entries, memory_cache_evictions
+from app.helpers.vector_store import VectorStore
 
 # Directory to store vector stores
-CACHE_DIR = "vector_cache"
+CACHE_DIR = os.getenv("VECTOR_CACHE_DIR", "vector_cache")
+
+# Content-addressed objects: objects/<sha256 of document bytes>/{index.faiss,chunks.sqlite}
+OBJECTS_DIR = os.path.join(CACHE_DIR, "objects")
 
 # Ensure base cache directory exists
-os.makedirs(CACHE_DIR, exist_ok=True)
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+
+# SQLite index mapping normalized URL -> content hash. WAL mode lets several
+# worker processes read and write it concurrently.
+URL_INDEX_FILE = os.path.join(CACHE_DIR, "url_index.sqlite")
+
+# Query parameters that only carry auth/expiry for signed URLs (Azure SAS,
+# S3/GCS presigned); they are dropped so re-signed URLs hit the same entry.
+SIGNATURE_PARAMS = {
+    "sv", "ss", "srt", "sp", "se", "st", "spr", "sig", "sr", "si", "skoid",
+    "sktid", "skt", "ske", "sks", "skv", "expires", "signature",
+    "awsaccesskeyid", "x-amz-security-token", "token",
+}
+SIGNATURE_PREFIXES = ("x-amz-", "x-goog-")
+
+# Cached URLs are revalidated with a conditional GET once their last check is
+# older than this many seconds (0: on every request, negative: never)
+REVALIDATE_AFTER = float(os.getenv("CACHE_REVALIDATE_SECONDS", "3600"))
+
+# Hot stores are kept open in memory in front of the disk store
+memory_cache = LRUCache(
+    max_entries=int(os.getenv("VECTOR_MEMORY_CACHE_ENTRIES", "32")),
+    max_bytes=int(os.getenv("VECTOR_MEMORY_CACHE_MB", "1024")) * 1024 * 1024,
+)
+memory_cache_entries.set_function(lambda: {(): memory_cache.stats()["entries"]})
+memory_cache_bytes.set_function(lambda: {(): memory_cache.stats()["bytes"]})
+memory_cache_evictions.set_function(lambda: {(): memory_cache.stats()["evictions"]})
+
+class UrlEntry(NamedTuple):
+    content_hash: str
+    etag: str
+    last_modified: str
+    validated_at: float
+
+# Columns added after the first release of the index, migrated in place
+_URL_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT", "validated_at": "REAL"}
+
+# WAL mode and the schema persist in the file, so they are set up once per
+# process rather than on every connection
+_schema_ready = False
+
+def _ensure_schema(conn):
+    global _schema_ready
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS urls ("
+        " url_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL,"
+        " source_url TEXT, updated_at REAL)"
+    )
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(urls)")}
+    for name, kind in _URL_COLUMNS.items():
+        if name not in existing:
+            try:
+                conn.execute(f"ALTER TABLE urls ADD COLUMN {name} {kind}")
+            except sqlite3.OperationalError:
+                pass  # added by another process meanwhile
+    _schema_ready = True
 
-# Mapping file to store URL-path mapping
-MAPPING_FILE = os.path.join(CACHE_DIR, "url_mapping.pkl")
+def _url_index():
+    conn = sqlite3.connect(URL_INDEX_FILE, timeout=30)
+    if not _schema_ready:
+        _ensure_schema(conn)
+    return closing(conn)
 
-# Load URL-path mapping if exists, else empty dict
-if os.path.exists(MAPPING_FILE):
-    with open(MAPPING_FILE, "rb") as f:
-        url_mapping = pickle.load(f)
-else:
-    url_mapping = {}
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: lowercased host, no fragment, no signature params."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in SIGNATURE_PARAMS and not k.lower().startswith(SIGNATURE_PREFIXES)
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+def object_dir(content_hash: str) -> str:
+    return os.path.join(OBJECTS_DIR, content_hash)
+
+def lookup_url(url: str):
+    """Returns the UrlEntry last recorded for this URL, if any."""
+    with _url_index() as conn:
+        row = conn.execute(
+            "SELECT content_hash, etag, last_modified, validated_at FROM urls WHERE url_key = ?",
+            (normalize_url(url),),
+        ).fetchone()
+    return UrlEntry(*row) if row else None
+
+def lookup_content_hash(url: str):
+    """Returns the content hash last recorded for this URL, if any."""
+    entry = lookup_url(url)
+    return entry.content_hash if entry else None
+
+def record_url(url: str, content_hash: str, etag: str = None, last_modified: str = None):
+    now = time.time()
+    with _url_index() as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO urls"
+            " (url_key, content_hash, source_url, updated_at, etag, last_modified, validated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (normalize_url(url), content_hash, url, now, etag, last_modified, now),
+        )
+
+def mark_validated(url: str):
+    """Records a 304 Not Modified: the cached entry is fresh again."""
+    with _url_index() as conn, conn:
+        conn.execute("UPDATE urls SET validated_at = ? WHERE url_key = ?", (time.time(), normalize_url(url)))
+
+def is_stale(entry: UrlEntry) -> bool:
+    """True once the entry is due for revalidation against the origin."""
+    if REVALIDATE_AFTER < 0:
+        return False
+    return time.time() - (entry.validated_at or 0) >= REVALIDATE_AFTER
+
+def load_vector_store(content_hash: str):
+    """Returns the vector store for a document hash, memory first, then disk."""
+    db = memory_cache.get(content_hash)
+    if db is not None:
+        return db
+    path = object_dir(content_hash)
+    if not os.path.exists(path):
+        return None
+    db = VectorStore.open(path)
+    memory_cache.put(content_hash, db, db.nbytes)
+    return db
 
 def load_vector_store_if_exists(url: str):
     """Returns the vector store if URL exists in cache."""
-    path = url_mapping.get(url)
-    if path and os.path.exists(path):
-        with open(path, "rb") as f:
-            return pickle.load(f)
-    return None
-
-def save_vector_store(db, url: str):
-    """Saves the vector store for a given URL in a new numbered directory."""
-    # If URL already cached, overwrite
-    if url in url_mapping:
-        path = url_mapping[url]
-    else:
-        # Generate new directory path
-        next_id = len(url_mapping) + 1
-        dir_path = os.path.join(CACHE_DIR, f"vector_store_{next_id}")
-        os.makedirs(dir_path, exist_ok=True)
-        path = os.path.join(dir_path, "db.pkl")
-        url_mapping[url] = path
-
-        # Save updated mapping
-        with open(MAPPING_FILE, "wb") as f:
-            pickle.dump(url_mapping, f)
-
-    # Save the actual DB
-    with open(path, "wb") as f:
-        pickle.dump(db, f)
\ No newline at end of file
+    content_hash = lookup_content_hash(url)
+    if content_hash is None:
+        return None
+    return load_vector_store(content_hash)
+
+def save_vector_store(index, documents, url: str, content_hash: str, pages: list = None,
+                      etag: str = None, last_modified: str = None):
+    """
+    Publishes the index + chunks under the document's content hash and points
+    the URL at it. Writers build in a private temp dir and rename it into
+    place, so concurrent writers of the same document never clash.
+    """
+    final_dir = object_dir(content_hash)
+    if not os.path.exists(final_dir):
+        tmp_dir = tempfile.mkdtemp(prefix=f".{content_hash}.", dir=OBJECTS_DIR)
+        os.chmod(tmp_dir, 0o755)
+        try:
+            VectorStore.write(tmp_dir, index, documents, pages)
+            os.rename(tmp_dir, final_dir)
+        except OSError:
+            # Another writer published the same content first
+            if not os.path.exists(final_dir):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    record_url(url, content_hash, etag, last_modified)
+    return load_vector_store(content_hash)
@@ -0,0 +1,143 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Max number of concurrent jobs per pipeline stage. Blocking stages run on
+# their own bounded thread pool so a slow stage can't starve the others,
+# and the event loop stays free to serve /health and other requests.
+STAGE_LIMITS = {
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", "16")),
+    "extract": int(os.getenv("EXTRACT_CONCURRENCY", "4")),
+    "embed": int(os.getenv("EMBED_CONCURRENCY", "2")),
+    "cache": int(os.getenv("CACHE_CONCURRENCY", "4")),
+    "retrieve": int(os.getenv("RETRIEVE_CONCURRENCY", "4")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "16")),
+}
+
+# Background (pre-ingestion) work may only hold this many slots of a stage,
+# so the rest are left for query-time ingests. Keep them below the stage
+# limits above, or background work can fill the stage.
+BACKGROUND_LIMITS = {
+    "extract": int(os.getenv("BACKGROUND_EXTRACT_CONCURRENCY", "2")),
+    "embed": int(os.getenv("BACKGROUND_EMBED_CONCURRENCY", "1")),
+}
+
+_executors = {}
+_semaphores = {}
+_background = contextvars.ContextVar("background", default=False)
+
+
+def get_executor(stage: str) -> ThreadPoolExecutor:
+    """Returns the bounded thread pool for a blocking stage."""
+    executor = _executors.get(stage)
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=STAGE_LIMITS[stage],
+            thread_name_prefix=f"{stage}-stage",
+        )
+        _executors[stage] = executor
+    return executor
+
+
+def _semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    # Semaphores are bound to the running event loop, so one is kept per loop
+    loop = asyncio.get_running_loop()
+    key = (name, id(loop))
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit)
+        _semaphores[key] = semaphore
+    return semaphore
+
+
+def mark_background():
+    """Marks the current task, and the tasks it starts, as background work."""
+    _background.set(True)
+
+
+@contextlib.asynccontextmanager
+async def _background_slot(stage: str):
+    # Background work waits here first, so at most BACKGROUND_LIMITS[stage]
+    # of it is ever queued on or holding the stage's own semaphore
+    async with _semaphore(f"background-{stage}", BACKGROUND_LIMITS[stage]):
+        async with _semaphore(stage, STAGE_LIMITS[stage]):
+            yield
+
+
+def stage_limit(stage: str):
+    """Returns the async context manager bounding concurrent work in a stage."""
+    if _background.get() and stage in BACKGROUND_LIMITS:
+        return _background_slot(stage)
+    return _semaphore(stage, STAGE_LIMITS[stage])
+
+
+async def run_in_stage(stage: str, fn, *args, **kwargs):
+    """Runs a blocking callable on the stage's executor without blocking the loop."""
+    async with stage_limit(stage):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(stage), functools.partial(fn, *args, **kwargs)
+        )
+
+
+class _ConsumerGone(Exception):
+    pass
+
+
+async def iterate_in_stage(stage: str, make_iter, *args, maxsize: int = 4):
+    """
+    Runs a blocking generator on the stage's executor and yields its items
+    to async code as they are produced. The bounded queue applies
+    backpressure, and the producer stops if the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    raise _ConsumerGone()
+
+    def produce():
+        try:
+            for item in make_iter(*args):
+                put(item)
+        except _ConsumerGone:
+            pass
+        finally:
+            try:
+                put(done)
+            except _ConsumerGone:
+                pass
+
+    producer = asyncio.ensure_future(run_in_stage(stage, produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        # Re-raise anything the generator raised
+        await producer
+    finally:
+        stop.set()
+
+
+def shutdown_executors():
+    """Stops all stage executors. Called on application shutdown."""
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
+    _semaphores.clear()
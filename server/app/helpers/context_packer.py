@@ -0,0 +1,186 @@
+import logging
+import os
+from typing import NamedTuple
+
+from langchain_core.documents import Document
+from app.helpers.llm_scheduler import estimate_tokens
+from app.helpers.metrics import context_empty_questions
+
+logger = logging.getLogger(__name__)
+
+# Max estimated tokens of passage text per LLM prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+
+class Passage(NamedTuple):
+    label: str
+    text: str
+    page: int
+    end_page: int
+    tokens: int
+
+
+class PackedContext(NamedTuple):
+    passages: list        # Passage, in document order
+    refs: list            # per question: labels of its passages, best match first
+    naive_tokens: int     # tokens if every question carried its own chunks
+    packed_tokens: int    # tokens actually sent
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.naive_tokens - self.packed_tokens
+
+
+class _Span:
+    """A run of merged chunks while packing."""
+
+    def __init__(self, doc: Document, rank: int):
+        meta = doc.metadata
+        self.text = doc.page_content
+        self.start = meta.get("start")
+        self.end = meta.get("end")
+        self.page = meta.get("page")
+        self.end_page = meta.get("end_page", self.page)
+        self.last_id = meta.get("chunk_id")
+        self.rank = rank
+        self.keys = {_chunk_key(doc)}
+
+    def extends_to(self, doc: Document) -> bool:
+        meta = doc.metadata
+        if self.end is not None and meta.get("start") is not None and meta["start"] <= self.end:
+            return True
+        return self.last_id is not None and meta.get("chunk_id") == self.last_id + 1
+
+    def extend(self, doc: Document, rank: int):
+        meta = doc.metadata
+        if meta.get("end") is not None and self.end is not None and meta["end"] <= self.end:
+            pass  # fully contained
+        elif meta.get("start") is not None and self.end is not None and meta["start"] < self.end:
+            # Overlap: append only the part past our end (text is the slice [start, end))
+            self.text += doc.page_content[self.end - meta["start"]:]
+        else:
+            self.text += " " + doc.page_content
+        if meta.get("end") is not None:
+            self.end = max(self.end or 0, meta["end"])
+        end_page = meta.get("end_page", meta.get("page"))
+        if end_page is not None:
+            self.end_page = max(self.end_page or end_page, end_page)
+        if meta.get("chunk_id") is not None:
+            self.last_id = max(self.last_id or 0, meta["chunk_id"])
+        self.rank = min(self.rank, rank)
+        self.keys.add(_chunk_key(doc))
+
+
+def _chunk_key(doc: Document):
+    chunk_id = doc.metadata.get("chunk_id")
+    return chunk_id if chunk_id is not None else doc.page_content
+
+
+def _position(doc: Document):
+    meta = doc.metadata
+    if meta.get("start") is not None:
+        return (0, meta["start"], meta.get("chunk_id") or 0)
+    if meta.get("chunk_id") is not None:
+        return (0, meta["chunk_id"], meta["chunk_id"])
+    return (1, 0, 0)
+
+
+def _merge_spans(contexts: list[list[Document]]) -> list:
+    """Unique chunks across questions, merged into spans in document order."""
+    # Unique chunks with their best rank across all questions
+    best = {}
+    for docs in contexts:
+        for rank, doc in enumerate(docs):
+            key = _chunk_key(doc)
+            if key not in best or rank < best[key][1]:
+                best[key] = (doc, rank)
+
+    # Merge in document order
+    spans = []
+    for doc, rank in sorted(best.values(), key=lambda item: _position(item[0])):
+        if spans and _position(doc)[0] == 0 and spans[-1].extends_to(doc):
+            spans[-1].extend(doc, rank)
+        else:
+            spans.append(_Span(doc, rank))
+    return spans
+
+
+def merged_tokens(contexts: list[list[Document]]) -> int:
+    """
+    Passage tokens pack_contexts would send for these contexts before any
+    budget cut; the batch planner uses it so planned batches fit unchanged.
+    """
+    return sum(estimate_tokens(span.text) for span in _merge_spans(contexts))
+
+
+def pack_contexts(
+    contexts: list[list[Document]],
+    questions: list[str],
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> PackedContext:
+    """
+    Turns per-question retrieved chunks into one set of shared passages:
+    chunks retrieved by several questions appear once, and overlapping or
+    adjacent chunks are merged into a single passage. Every question first
+    gets the passage holding its best match, truncated if the budget is
+    short; the remaining passages are then kept in order of their best
+    retrieval rank until token_budget is used up.
+    """
+    naive_tokens = sum(estimate_tokens(d.page_content) for docs in contexts for d in docs)
+    spans = _merge_spans(contexts)
+    span_of = {key: i for i, span in enumerate(spans) for key in span.keys}
+
+    # Each question's best passage, shared between questions that have the same one
+    firsts = []
+    for docs in contexts:
+        if docs:
+            i = span_of[_chunk_key(docs[0])]
+            if i not in firsts:
+                firsts.append(i)
+
+    # Smallest first, so when the budget is short the long passages share
+    # the truncation evenly
+    kept, used = set(), 0
+    firsts.sort(key=lambda i: estimate_tokens(spans[i].text))
+    for n, i in enumerate(firsts):
+        share = (token_budget - used) // (len(firsts) - n)
+        if share <= 0:
+            break
+        if estimate_tokens(spans[i].text) > share:
+            spans[i].text = spans[i].text[:share * 4]
+        kept.add(i)
+        used += estimate_tokens(spans[i].text)
+
+    # Then further passages by rank, whole, while they fit
+    for i in sorted(range(len(spans)), key=lambda i: (spans[i].rank, i)):
+        if i in kept:
+            continue
+        tokens = estimate_tokens(spans[i].text)
+        if used + tokens <= token_budget:
+            kept.add(i)
+            used += tokens
+
+    passages, label_of = [], {}
+    for i, span in enumerate(spans):
+        if i not in kept:
+            continue
+        label = f"P{len(passages) + 1}"
+        label_of[i] = label
+        passages.append(Passage(label, span.text, span.page, span.end_page, estimate_tokens(span.text)))
+
+    refs = []
+    for docs in contexts:
+        labels = []
+        for doc in docs:
+            for i, span in enumerate(spans):
+                if i in label_of and _chunk_key(doc) in span.keys and label_of[i] not in labels:
+                    labels.append(label_of[i])
+        refs.append(labels)
+
+    empty = sum(1 for labels in refs if not labels)
+    if empty:
+        context_empty_questions.inc(empty)
+        logger.warning("%d/%d questions sent without passages", empty, len(questions))
+
+    packed_tokens = sum(p.tokens for p in passages) + sum(len(", ".join(r)) // 4 for r in refs)
+    return PackedContext(passages, refs, naive_tokens, packed_tokens)
@@ -1,54 +1,156 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.docstore.document import Document
-from concurrent.futures import ThreadPoolExecutor
-import math
+from langchain_core.documents import Document
+from app.helpers.cache_manager import CACHE_DIR
+from app.helpers.embedding_cache import EmbeddingCache
+from app.helpers.index_factory import build_index
+from app.helpers.metrics import record_cache
+import numpy as np
+import os
+import threading
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-small-en-v1.5",
-    model_kwargs={"device": "cpu"},
-    encode_kwargs={"batch_size": 128}
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
 
-)
+# Texts per forward pass, and torch intra-op threads (0 keeps torch's default)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
 
-def embed_chunks(chunks):
-    docs = [Document(page_content=chunk) for chunk in chunks]
-    db = FAISS.from_documents(docs, embedding_model)
-    return db
+# torch / sentence-transformers take seconds to import, so the model and the
+# on-disk embedding cache are created on first use (or by app.helpers.warmup)
+_embedding_model = None
+_embedding_cache = None
+_model_lock = threading.Lock()
+_cache_lock = threading.Lock()
 
-def embed_chunks_parallel(chunks, batch_size: int = 50, num_threads: int = 4):
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        with _model_lock:
+            if _embedding_model is None:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+
+                if EMBED_THREADS > 0:
+                    import torch
+
+                    torch.set_num_threads(EMBED_THREADS)
+                _embedding_model = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    model_kwargs={"device": "cpu"},
+                    encode_kwargs={"batch_size": EMBED_BATCH_SIZE}
+
+                )
+    return _embedding_model
+
+def get_embedding_cache():
+    """Chunk embeddings shared across documents; boilerplate clauses are encoded once."""
+    global _embedding_cache
+    if _embedding_cache is None and os.getenv("EMBEDDING_CACHE", "1") != "0":
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    os.path.join(CACHE_DIR, "embeddings", EMBEDDING_MODEL_NAME.replace("/", "__")),
+                    EMBEDDING_MODEL_NAME,
+                )
+    return _embedding_cache
+
+def encode_texts(texts: list[str], batch_size: int = None) -> np.ndarray:
+    """Encodes texts straight to a float32 (n, dim) matrix, skipping Python lists."""
+    return get_embedding_model().client.encode(
+        texts,
+        batch_size=batch_size or EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    ).astype("float32", copy=False)
+
+class EmbeddingMatrix:
+    """Preallocated float32 matrix that grows geometrically as batches arrive."""
+
+    def __init__(self, dim: int = None, capacity: int = 1024):
+        self.dim = dim
+        self.capacity = capacity
+        self.size = 0
+        self._data = None
+
+    def append(self, vectors: np.ndarray):
+        if self._data is None:
+            self.dim = self.dim or vectors.shape[1]
+            self._data = np.empty((max(self.capacity, len(vectors)), self.dim), dtype="float32")
+        needed = self.size + len(vectors)
+        if needed > len(self._data):
+            grown = np.empty((max(needed, 2 * len(self._data)), self.dim), dtype="float32")
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = vectors
+        self.size = needed
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._data is None:
+            return np.empty((0, self.dim or 0), dtype="float32")
+        return self._data[:self.size]
+
+class ChunkEmbedder:
+    """
+    Accumulates (ChunkSpan, text) batches into one embedding matrix and one
+    document list, then builds a single index. Used by the streaming ingest.
+    """
+
+    def __init__(self, batch_size: int = None, capacity: int = 1024, cache: EmbeddingCache = None):
+        self.batch_size = batch_size
+        self.matrix = EmbeddingMatrix(capacity=capacity)
+        self.documents = []
+        self.cache = cache if cache is not None else get_embedding_cache()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encodes only texts the embedding cache hasn't seen, then fills in the rest."""
+        if self.cache is None:
+            self.cache_misses += len(texts)
+            return encode_texts(texts, self.batch_size)
+        keys, vectors, missing = self.cache.lookup(texts)
+        if missing:
+            encoded = encode_texts([texts[i] for i in missing], self.batch_size)
+            if vectors is None:
+                vectors = encoded
+            else:
+                vectors[missing] = encoded
+            self.cache.add([keys[i] for i in missing], encoded)
+        self.cache_hits += len(texts) - len(missing)
+        self.cache_misses += len(missing)
+        record_cache("embedding", len(texts) - len(missing), len(missing))
+        return vectors
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else 0.0
+
+    def add(self, chunks, vectors: np.ndarray = None):
+        """Appends chunks, encoding them unless their vectors are already known."""
+        if vectors is None:
+            vectors = self.encode([text for _, text in chunks])
+        self.matrix.append(vectors)
+        self.documents.extend(
+            Document(page_content=text, metadata=span._asdict()) for span, text in chunks
+        )
+
+    def build(self, index_type: str = None):
+        """
+        Returns (index, documents) ready for save_vector_store. The index type
+        (flat/hnsw/ivfpq) follows corpus size unless given.
+        """
+        return build_index(self.matrix.array, index_type), self.documents
+
+def embed_chunks_parallel(chunks, batch_size: int = None, use_cache: bool = True, index_type: str = None):
     """
-    Create embeddings in parallel batches for faster processing
+    Embeds all chunks in large contiguous batches and builds one index.
+    Accepts plain strings or (ChunkSpan, text) pairs; returns (index, documents).
     """
-    from langchain_community.vectorstores import FAISS
-    from langchain.docstore.document import Document
-    
-    # If chunks are small, use regular embedding
-    if len(chunks) < 100:
-        return embed_chunks(chunks)
-    
-    # Split chunks into batches
-    chunk_batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
-    
-    def create_batch_embeddings(batch_chunks):
-        docs = [Document(page_content=chunk) for chunk in batch_chunks]
-        return FAISS.from_documents(docs, embedding_model)
-    
-    # Process batches in parallel
-    vector_stores = []
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(create_batch_embeddings, batch) for batch in chunk_batches]
-        
-        for future in futures:
-            vs = future.result()
-            vector_stores.append(vs)
-    
-    # Merge all vector stores
-    if len(vector_stores) == 1:
-        return vector_stores[0]
-    
-    main_vs = vector_stores[0]
-    for vs in vector_stores[1:]:
-        main_vs.merge_from(vs)
-    
-    return main_vs
\ No newline at end of file
+    embedder = ChunkEmbedder(batch_size=batch_size, capacity=len(chunks))
+    if not use_cache:
+        embedder.cache = None
+    if chunks and isinstance(chunks[0], str):
+        embedder.matrix.append(embedder.encode(chunks))
+        embedder.documents = [Document(page_content=chunk) for chunk in chunks]
+    else:
+        embedder.add(chunks)
+    return embedder.build(index_type)
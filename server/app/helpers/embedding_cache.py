@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from filelock import FileLock
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.sqlite"
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk-embedding cache shared by all documents and workers.
+
+    Vectors live in an append-only raw float32 file that readers memory-map;
+    a SQLite index maps hash(model name, chunk text) to the row number.
+    Appends are serialized across processes with a lock file, and rows are
+    only published in the index after they're written, so readers never see
+    a partial row.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, VECTORS_FILE)
+        self._file_lock = FileLock(os.path.join(path, "append.lock"), thread_local=False)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, INDEX_FILE), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self._mmap = None
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()[:16]
+
+    def _rows(self, keys: list[bytes]) -> dict:
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT key, row FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall())
+        return found
+
+    def _vectors(self, max_row: int) -> np.ndarray:
+        """
+        Memory-maps the vector file, remapping if it has grown past max_row.
+        Only whole rows are mapped: another thread or process may be halfway
+        through an append, or a crashed writer may have left a partial row.
+        """
+        mapped = self._mmap
+        if mapped is None or max_row >= len(mapped):
+            rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+            mapped = self._mmap = np.memmap(self._vectors_path, dtype="float32", mode="r", shape=(rows, self.dim))
+        return mapped
+
+    def lookup(self, texts: list[str]):
+        """
+        Returns (keys, vectors, missing): vectors is an (n, dim) float32 matrix
+        with cached rows filled in (None if the cache is still empty), and
+        missing lists the positions that still need encoding.
+        """
+        keys = [self.key(text) for text in texts]
+        if self.dim is None:
+            return keys, None, list(range(len(texts)))
+        rows = self._rows(keys)
+        vectors = np.empty((len(texts), self.dim), dtype="float32")
+        hit_positions = [i for i, k in enumerate(keys) if k in rows]
+        if hit_positions:
+            hit_rows = np.fromiter((rows[keys[i]] for i in hit_positions), dtype="int64")
+            vectors[hit_positions] = self._vectors(int(hit_rows.max()))[hit_rows]
+        missing = [i for i, k in enumerate(keys) if k not in rows]
+        return keys, vectors, missing
+
+    def add(self, keys: list[bytes], vectors: np.ndarray):
+        """Appends new vectors and publishes their keys."""
+        if not keys:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self._lock, self._file_lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._conn.commit()
+            row_bytes = self.dim * 4
+            with open(self._vectors_path, "ab") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size % row_bytes:
+                    # Drop a partial row left by a crashed writer
+                    f.truncate(size - size % row_bytes)
+                    size -= size % row_bytes
+                f.write(vectors.tobytes())
+            first_row = size // row_bytes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, row) VALUES (?, ?)",
+                ((key, first_row + i) for i, key in enumerate(keys)),
+            )
+            self._conn.commit()
@@ -0,0 +1,103 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+# "auto" picks by corpus size; "flat", "hnsw" or "ivfpq" forces a type
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")
+
+# auto: exact search below HNSW_MIN_VECTORS, HNSW up to IVFPQ_MIN_VECTORS, IVF-PQ above
+HNSW_MIN_VECTORS = int(os.getenv("HNSW_MIN_VECTORS", "50000"))
+IVFPQ_MIN_VECTORS = int(os.getenv("IVFPQ_MIN_VECTORS", "500000"))
+
+# Build-time parameters
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+IVFPQ_BYTES_PER_VECTOR = int(os.getenv("IVFPQ_BYTES_PER_VECTOR", "48"))
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", "100000"))
+
+# Search-time parameters, applied whenever an index is loaded
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+
+
+def choose_index_type(n_vectors: int, index_type: str = None) -> str:
+    index_type = index_type or INDEX_TYPE
+    if index_type != "auto":
+        if index_type not in ("flat", "hnsw", "ivfpq"):
+            raise ValueError(f"Unknown index type: {index_type}")
+        return index_type
+    if n_vectors < HNSW_MIN_VECTORS:
+        return "flat"
+    if n_vectors < IVFPQ_MIN_VECTORS:
+        return "hnsw"
+    return "ivfpq"
+
+
+def _pq_subquantizers(dim: int, bytes_per_vector: int) -> int:
+    """Largest subquantizer count <= bytes_per_vector that divides dim."""
+    m = min(bytes_per_vector, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_ivfpq(vectors: np.ndarray, nlist: int = None, bytes_per_vector: int = None,
+                train_sample: int = None, seed: int = 0):
+    """IVF-PQ trained on a random sample of the vectors (8-bit codes)."""
+    n, dim = vectors.shape
+    nlist = nlist or max(1, int(4 * math.sqrt(n)))
+    m = _pq_subquantizers(dim, bytes_per_vector or IVFPQ_BYTES_PER_VECTOR)
+    quantizer = faiss.IndexFlatL2(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8)
+    sample_size = min(n, max(train_sample or IVF_TRAIN_SAMPLE, 39 * nlist))
+    sample = vectors
+    if sample_size < n:
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))]
+    index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def build_index(vectors: np.ndarray, index_type: str = None):
+    """Builds the index for an embedding matrix; the type is chosen by corpus size unless given."""
+    n, dim = vectors.shape
+    index_type = choose_index_type(n, index_type)
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+        index.add(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.add(vectors)
+    else:
+        index = build_ivfpq(vectors)
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(index, ef_search: int = None, nprobe: int = None):
+    """Sets query-time knobs (HNSW efSearch, IVF nprobe); no-op for flat indexes."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+        return index
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe or IVF_NPROBE
+    except RuntimeError:
+        pass
+    return index
+
+
+def describe_index(index) -> str:
+    """Short label for logs, e.g. 'IndexHNSWFlat(n=120000, efSearch=64)'."""
+    label = f"{type(index).__name__}(n={index.ntotal}"
+    if isinstance(index, faiss.IndexHNSW):
+        label += f", efSearch={index.hnsw.efSearch}"
+    else:
+        try:
+            label += f", nprobe={faiss.extract_index_ivf(index).nprobe}"
+        except RuntimeError:
+            pass
+    return label + ")"
@@ -1,43 +1,106 @@
+import asyncio
 import json
-import google.generativeai as genai
+import logging
+import threading
+from typing import TypedDict
 from langchain_core.documents import Document
 import os
 from dotenv import load_dotenv
+from app.helpers.llm_scheduler import scheduler, estimate_tokens
+from app.helpers.context_packer import PROMPT_TOKEN_BUDGET, PackedContext, Passage, merged_tokens, pack_contexts
+from app.helpers.metrics import llm_failed_questions, llm_retried_questions, prompt_tokens
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 # ─── Hard‑coded Gemini API key ─────────────────────────────────────────────────
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash-lite")
+MODEL_NAME = "gemini-2.5-flash-lite"
 
-def generate_batch_answer(
-    contexts: list[list[Document]],
+# Created on first use (or by app.helpers.warmup): importing the Gemini SDK
+# costs about a second of startup
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+# Bump whenever the prompt or output format changes: cached answers are keyed by it
+PROMPT_VERSION = "2"
+ANSWER_VERSION = f"{MODEL_NAME}:{PROMPT_VERSION}"
+
+# Estimated passage tokens and questions per LLM call, and retry rounds for
+# questions that come back without a valid answer. Batches are planned and
+# packed against the same budget, so planned batches never lose passages.
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "10"))
+MAX_ANSWER_RETRIES = int(os.getenv("MAX_ANSWER_RETRIES", "2"))
+FAILED_ANSWER = "❌ Error"
+
+class BatchAnswer(TypedDict):
+    question: int
+    answer: str
+
+class BatchAnswers(TypedDict):
+    answers: list[BatchAnswer]
+
+# JSON output mode: Gemini has to return this schema
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": BatchAnswers,
+}
+
+def format_passage(passage: Passage) -> str:
+    """Passage text prefixed with its label and page, so answers can cite where they came from."""
+    if passage.page is None:
+        return f"[{passage.label}] {passage.text}"
+    end_page = passage.end_page or passage.page
+    pages = f"p. {passage.page}" if end_page == passage.page else f"pp. {passage.page}-{end_page}"
+    return f"[{passage.label} | {pages}] {passage.text}"
+
+def build_batch_prompt(
+    packed: PackedContext,
     questions: list[str],
-) -> list[str]:
-    """
-    Sends all questions+contexts in one shot, asks Gemini to reply
-    with {"answers": [...]} JSON, then parses it robustly.
-    """
-    # 1) Build the prompt
+) -> str:
+    """Shared passages are listed once; each question points at the ones it needs."""
     prompt = "You are a helpful assistant.\n\n"
-    for idx, (q, ctx_docs) in enumerate(zip(questions, contexts), 1):
-        ctx_text = "\n".join(d.page_content for d in ctx_docs)
+    prompt += "Passages:\n" + "\n\n".join(format_passage(p) for p in packed.passages) + "\n\n"
+    for idx, (q, refs) in enumerate(zip(questions, packed.refs), 1):
         prompt += (
-            f"Question {idx}:\n{q}\n\n"
-            f"Context {idx}:\n{ctx_text}\n\n"
+            f"Question {idx}:\n{q}\n"
+            f"Relevant passages {idx}: {', '.join(refs) or 'none'}\n\n"
         )
     prompt += (
         "You are a specialist in insurance, legal, HR, and compliance domains language. I will give you a list of questions and their raw answers. For each question, produce:1. a concise, precise “refined_answer” that uses exact numbers, terms, and conditions;  2. a “keywords” list of 3–5 short phrases capturing the core concepts;"
-        "Please **only** return a JSON object with this schema:\n"
-        '{"answers": ["Answer to Q1", "Answer to Q2", ...]}\n'
+        "Please **only** return a JSON object with this schema, one entry per question:\n"
+        '{"answers": [{"question": 1, "answer": "Answer to Q1"}, {"question": 2, "answer": "Answer to Q2"}, ...]}\n'
         "Do not include any additional text, explanation, or formatting. Keep it short and to the point.\n"
     )
+    return prompt
 
-    # 2) Call Gemini
-    response = model.generate_content(prompt)
-    raw = response.text.strip()
+def response_text(response) -> str:
+    """Response text, or "" when Gemini returned no usable candidate (blocked, empty)."""
+    try:
+        return response.text.strip()
+    except ValueError:
+        return ""
 
-    # 3) Sanitize: if it’s not valid JSON, try to pull out the first {...} block
+def parse_batch_answer(raw: str, n_questions: int) -> dict:
+    """
+    Parses {"answers": [{"question": i, "answer": "..."}]} into {position: answer}
+    (0-based). Only well-formed, non-empty answers are returned, so callers
+    can see exactly which questions still need an answer.
+    """
+    # Sanitize: if it’s not valid JSON, try to pull out the first {...} block
     json_str = raw
     if not raw.startswith("{"):
         start = raw.find("{")
@@ -45,41 +108,139 @@ def generate_batch_answer(
         if start != -1 and end != -1 and end > start:
             json_str = raw[start : end + 1]
 
-    # 4) Parse
     try:
-        payload = json.loads(json_str)
-        answers = payload.get("answers")
-        if not isinstance(answers, list) or len(answers) != len(questions):
-            raise ValueError(f"Wrong format: {payload!r}")
-        return [str(a).strip() for a in answers]
+        answers = json.loads(json_str).get("answers")
+    except (ValueError, AttributeError) as e:
+        logger.warning("Gemini batch error: %s | raw response: %.200s", e, raw)
+        return {}
+    if not isinstance(answers, list):
+        return {}
+
+    parsed = {}
+    if len(answers) == n_questions and all(isinstance(a, str) for a in answers):
+        # Plain list in question order
+        parsed = {i: a.strip() for i, a in enumerate(answers)}
+    else:
+        for item in answers:
+            if not isinstance(item, dict):
+                continue
+            try:
+                position = int(item.get("question")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < n_questions and isinstance(item.get("answer"), str):
+                parsed[position] = item["answer"].strip()
+    return {i: a for i, a in parsed.items() if a}
 
+async def generate_batch_answer_async(
+    packed: PackedContext,
+    questions: list[str],
+) -> dict:
+    """
+    Sends packed passages and questions in one prompt in JSON output mode,
+    awaits Gemini through the shared rate-limit scheduler, and returns only
+    the valid answers as {position: answer}.
+    """
+    prompt = build_batch_prompt(packed, questions)
+    response = await scheduler.submit(
+        get_model().generate_content_async, prompt,
+        est_tokens=estimate_tokens(prompt), generation_config=GENERATION_CONFIG,
+    )
+    return parse_batch_answer(response_text(response), len(questions))
+
+class AnswerStats:
+    """Per-request counters for the answering stage."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.retried_questions = 0
+        self.failed_questions = 0
+        self.naive_tokens = 0
+        self.packed_tokens = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.naive_tokens - self.packed_tokens
+
+def plan_batches(
+    contexts: list[list[Document]],
+    questions: list[str],
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    max_questions: int = MAX_BATCH_QUESTIONS,
+) -> list[list[int]]:
+    """
+    Groups question positions into LLM calls by estimated passage tokens.
+    A batch is costed the way the packer sends it (shared chunks once,
+    overlapping and adjacent chunks merged), so pack_contexts with the same
+    budget keeps every passage of a planned batch.
+    """
+    batches, current = [], []
+    for i in range(len(questions)):
+        if current and (
+            len(current) >= max_questions
+            or merged_tokens([contexts[j] for j in current + [i]]) > token_budget
+        ):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+async def answer_batch(
+    contexts: list[list[Document]],
+    questions: list[str],
+    stats: AnswerStats = None,
+    attempt: int = 0,
+) -> list[str]:
+    """
+    Answers one planned batch. If some answers come back missing or invalid,
+    only those questions are asked again; if the whole batch fails (including
+    a Gemini call that raised) it is split in half. After MAX_ANSWER_RETRIES rounds a question gets
+    FAILED_ANSWER and is logged.
+    """
+    stats = stats or AnswerStats()
+    packed = pack_contexts(contexts, questions, BATCH_TOKEN_BUDGET)
+    stats.llm_calls += 1
+    if attempt == 0:
+        stats.naive_tokens += packed.naive_tokens
+        stats.packed_tokens += packed.packed_tokens
+        prompt_tokens.inc(packed.naive_tokens, kind="naive")
+        prompt_tokens.inc(packed.packed_tokens, kind="packed")
+    try:
+        answers = await generate_batch_answer_async(packed, questions)
     except Exception as e:
-        print("Gemini batch error:", e, "| raw response:", raw[:200])
-        # 5) Fallback: split by markers in the raw text
-        try:
-            payload = json.loads(json_str)
-            if 'answers' in payload and isinstance(payload['answers'], list):
-                print("🔄 Found valid answers in payload despite error, using them")
-                answers = payload['answers']
-                # Ensure we have the right number of answers
-                while len(answers) < len(questions):
-                    answers.append("❌ Error")
-                return [str(a).strip() for a in answers[:len(questions)]]
-        except:
-            pass
-            
-        # 6) Fallback: split by markers in the raw text
-        print("🔄 Using fallback parsing method")
-        fallback = []
-        for i in range(1, len(questions) + 1):
-            marker = f"Answer {i}:"
-            parts  = raw.split(marker, 1)
-            if len(parts) == 2:
-                # take everything after marker up to next marker
-                rest = parts[1]
-                next_marker = f"Answer {i+1}:"
-                text = rest.split(next_marker, 1)[0].strip()
-                fallback.append(text)
-            else:
-                fallback.append("❌ Error")
-        return fallback
\ No newline at end of file
+        # Still failing after the scheduler's retries (429/5xx/timeout) or not
+        # retryable: treat every answer as missing so only this batch is
+        # split and retried, instead of failing the whole request
+        logger.warning("❌ Gemini call for %d questions failed: %s", len(questions), e)
+        answers = {}
+    missing = [i for i in range(len(questions)) if i not in answers]
+    if not missing:
+        return [answers[i] for i in range(len(questions))]
+
+    if attempt >= MAX_ANSWER_RETRIES:
+        logger.warning("❌ No valid answer after %d attempts for %d questions", attempt + 1, len(missing))
+        logger.debug("❌ Unanswered questions: %s", [questions[i] for i in missing])
+        stats.failed_questions += len(missing)
+        llm_failed_questions.inc(len(missing))
+        return [answers.get(i, FAILED_ANSWER) for i in range(len(questions))]
+
+    stats.retried_questions += len(missing)
+    llm_retried_questions.inc(len(missing))
+    if len(missing) == len(questions) and len(questions) > 1:
+        # Nothing usable: the batch may be too big, retry as two halves
+        logger.info("🔄 Batch of %d failed, splitting in half", len(questions))
+        half = len(questions) // 2
+        left, right = await asyncio.gather(
+            answer_batch(contexts[:half], questions[:half], stats, attempt + 1),
+            answer_batch(contexts[half:], questions[half:], stats, attempt + 1),
+        )
+        return left + right
+
+    logger.info("🔄 Retrying %d/%d missing answers", len(missing), len(questions))
+    retried = await answer_batch(
+        [contexts[i] for i in missing], [questions[i] for i in missing], stats, attempt + 1
+    )
+    answers.update(zip(missing, retried))
+    return [answers[i] for i in range(len(questions))]
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+from app.helpers.concurrency import stage_limit
+from app.helpers.metrics import llm_calls, llm_in_flight, llm_retries, span
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limited or a transient server error
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token) used for TPM budgeting."""
+    return max(1, len(text) // 4)
+
+
+def is_retryable(exc: Exception) -> bool:
+    code = getattr(exc, "code", None)
+    if callable(code):  # grpc style errors expose code() instead of an int
+        try:
+            code = code()
+        except Exception:
+            code = None
+    code = getattr(code, "value", code)
+    if isinstance(code, tuple):
+        code = code[0]
+    if code in RETRYABLE_STATUS:
+        return True
+    # grpc codes for RESOURCE_EXHAUSTED / UNAVAILABLE / DEADLINE_EXCEEDED
+    if code in (8, 14, 4):
+        return True
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError))
+
+
+class RateLimitedScheduler:
+    """
+    Process-wide gate for Gemini calls. Keeps a sliding 60s window of sent
+    requests and tokens so every in-flight request shares the same RPM/TPM
+    budget, and retries 429/5xx with exponential backoff plus full jitter.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 30.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._window = deque()  # (timestamp, tokens)
+        self._window_tokens = 0
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now: float):
+        while self._window and now - self._window[0][0] >= 60.0:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+    async def _acquire(self, tokens: int):
+        # A single prompt larger than the whole budget would wait forever
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                if len(self._window) < self.rpm and self._window_tokens + tokens <= self.tpm:
+                    self._window.append((now, tokens))
+                    self._window_tokens += tokens
+                    return
+                # Sleep until the oldest entry leaves the window
+                await asyncio.sleep(max(0.05, 60.0 - (now - self._window[0][0])))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def submit(self, fn, *args, est_tokens: int = 1, **kwargs):
+        """Awaits fn(*args, **kwargs) once budget allows, retrying transient failures."""
+        attempt = 0
+        while True:
+            with span("llm_rate_wait"):
+                await self._acquire(est_tokens)
+            try:
+                async with stage_limit("llm"):
+                    llm_calls.inc()
+                    with llm_in_flight.track_inprogress(), span("llm"):
+                        return await fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                llm_retries.inc()
+                delay = self._backoff(attempt)
+                logger.warning("⏳ LLM call failed (%s); retry %d/%d in %.1fs", e, attempt + 1, self.max_retries, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+scheduler = RateLimitedScheduler(
+    rpm=int(os.getenv("GEMINI_RPM", "1000")),
+    tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "4")),
+)
@@ -0,0 +1,225 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (ms) up to cold ingests of large documents (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REGISTRY = []
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """
+    Minimal Prometheus metric family: values per label set, kept in this
+    process only (each uvicorn worker exposes its own /metrics).
+    """
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._function = None
+        if not self.labelnames and self.kind in ("counter", "gauge"):
+            self._values[()] = 0  # unlabelled series are exported from the start
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, fn):
+        """fn() -> {label values tuple: value}, evaluated at scrape time."""
+        self._function = fn
+
+    def samples(self):
+        """Yields (suffix, label values, extra labels, value)."""
+        if self._function is not None:
+            for key, value in self._function().items():
+                yield "", tuple(str(v) for v in key), (), value
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", key, (), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (non-cumulative), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), count
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Requests (recorded by the HTTP middleware in app.main)
+request_seconds = Histogram("rag_request_seconds", "HTTP request latency until the response starts.", ["path"])
+requests_total = Counter("rag_requests_total", "HTTP requests by path and status code.", ["path", "status"])
+requests_in_flight = Gauge("rag_requests_in_flight", "HTTP requests currently being handled.")
+
+# Pipeline stages
+stage_seconds = Histogram("rag_stage_seconds", "Time spent per pipeline stage.", ["stage"])
+
+# Caches: vector_store (by URL), answer, embedding (per chunk), query (per question)
+cache_lookups = Counter("rag_cache_lookups_total", "Cache lookups by cache and result (hit/miss).", ["cache", "result"])
+cache_hit_ratio = Gauge("rag_cache_hit_ratio", "Hits / lookups per cache since start.", ["cache"])
+
+# In-memory vector store LRU (set up by app.helpers.cache_manager)
+memory_cache_entries = Gauge("rag_vector_memory_cache_entries", "Vector stores held in memory.")
+memory_cache_bytes = Gauge("rag_vector_memory_cache_bytes", "Estimated bytes of the vector stores held in memory.")
+memory_cache_evictions = Counter("rag_vector_memory_cache_evictions_total", "Vector stores evicted from memory.")
+
+# Ingestion and prompt volume
+ingested_chunks = Counter("rag_ingested_chunks_total", "Chunks stored by ingests.")
+ingested_tokens = Counter("rag_ingested_tokens_total", "Tokenizer tokens in chunks stored by ingests.")
+prompt_tokens = Counter("rag_prompt_tokens_total", "Estimated prompt passage tokens (naive: per-question chunks; packed: sent).", ["kind"])
+context_empty_questions = Counter("rag_context_empty_questions_total", "Questions sent to the LLM without any passage.")
+
+# LLM
+llm_calls = Counter("rag_llm_calls_total", "Gemini calls, including retries.")
+llm_retries = Counter("rag_llm_retries_total", "Gemini calls retried after a transient error (429/5xx/timeout).")
+llm_retried_questions = Counter("rag_llm_retried_questions_total", "Questions asked again after a missing or invalid answer.")
+llm_failed_questions = Counter("rag_llm_failed_questions_total", "Questions answered with the error placeholder.")
+llm_in_flight = Gauge("rag_llm_in_flight", "Gemini calls currently awaiting a response.")
+
+# Background ingestion (set up by app.services.document_processor)
+ingest_queue_depth = Gauge("rag_ingest_queue_depth", "Ingest jobs waiting for a worker.")
+
+# Startup (set by app.helpers.warmup)
+startup_seconds = Gauge("rag_startup_seconds", "Seconds spent per startup phase (import, preload, warmup, ready).", ["phase"])
+ready = Gauge("rag_ready", "1 once the worker has warmed up and serves traffic.")
+
+
+def record_cache(cache: str, hits: int, misses: int):
+    if hits:
+        cache_lookups.inc(hits, cache=cache, result="hit")
+    if misses:
+        cache_lookups.inc(misses, cache=cache, result="miss")
+
+
+def _hit_ratios() -> dict:
+    totals = {}
+    for (cache, result), value in list(cache_lookups._values.items()):
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), lookups + value)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+cache_hit_ratio.set_function(_hit_ratios)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Times a pipeline stage into rag_stage_seconds and logs it at DEBUG."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            extra = "".join(f" {key}={value}" for key, value in fields.items())
+            logger.debug("span stage=%s seconds=%.4f%s", stage, elapsed, extra)
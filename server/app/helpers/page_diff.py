@@ -0,0 +1,76 @@
+from typing import NamedTuple
+
+from app.helpers.processor import ChunkSpan, iter_chunk_spans
+
+
+class PageUpdatePlan(NamedTuple):
+    changed: list     # page numbers that differ, were added or were removed
+    kept: list        # (old chunk id, ChunkSpan remapped to the new text, text)
+    dirty_runs: list  # (start, end) offsets of new text to re-chunk; end None: to the end
+
+
+def plan_page_update(old_records: list, new_records: list, old_documents: list) -> PageUpdatePlan:
+    """
+    Matches pages by number. Chunks that only cover unchanged pages are kept
+    (their offsets shifted to the new text). The text between kept chunks
+    is re-chunked: each run starts where its first dropped chunk started
+    when that text is unchanged (so it overlaps the kept chunk before it
+    like a fresh ingest would), otherwise right after the kept chunk, and
+    ends where the next kept chunk starts. No text is chunked twice.
+    """
+    old = {r.page: r for r in old_records}
+    new = {r.page: r for r in new_records}
+    changed = sorted(
+        p for p in old.keys() | new.keys()
+        if p not in old or p not in new or old[p].hash != new[p].hash
+    )
+    changed_set = set(changed)
+
+    def shift(offset: int, page: int) -> int:
+        # Unchanged pages have unchanged lengths, so the page's shift fits any offset on it
+        return offset + new[page].start - old[page].start
+
+    kept, runs = [], []
+    run_start, dropped = 0, False
+    for doc in sorted(old_documents, key=lambda d: d.metadata["start"]):
+        meta = doc.metadata
+        if changed_set.isdisjoint(range(meta["page"], meta["end_page"] + 1)):
+            span = ChunkSpan(
+                shift(meta["start"], meta["page"]), shift(meta["end"], meta["end_page"]),
+                meta["page"], meta["end_page"], meta["tokens"],
+            )
+            if run_start < span.start:
+                runs.append((run_start, span.start))
+            kept.append((meta["chunk_id"], span, doc.page_content))
+            run_start, dropped = span.end, False
+        elif not dropped:
+            dropped = True
+            if meta["page"] not in changed_set:
+                run_start = min(run_start, shift(meta["start"], meta["page"]))
+    # Text after the last kept chunk: dropped chunks or appended pages
+    runs.append((run_start, None))
+    return PageUpdatePlan(changed, kept, runs)
+
+
+def rechunk_runs(pages: dict, plan: PageUpdatePlan, new_records: list, chunk_size: int = 200,
+                 overlap: int = 50, unit: str = "words") -> list:
+    """Chunks each dirty run on its own; returns (ChunkSpan, text) with document offsets."""
+    chunks = []
+    for start, end in plan.dirty_runs:
+        # The run's slice of every page it touches, keeping page numbers;
+        # pages are joined by one newline, like the document text
+        sliced = []
+        for record in new_records:
+            text = pages[record.page]
+            lo = max(start, record.start) - record.start
+            hi = len(text) if end is None else min(end, record.start + len(text)) - record.start
+            if lo < hi or (sliced and lo <= hi):
+                sliced.append((record.page, text[lo:hi]))
+            if end is not None and record.start + len(text) >= end:
+                break
+        if not sliced:
+            continue
+        base = max(start, next(r.start for r in new_records if r.page == sliced[0][0]))
+        for span, text in iter_chunk_spans(sliced, chunk_size, overlap, unit):
+            chunks.append((span._replace(start=span.start + base, end=span.end + base), text))
+    return chunks
@@ -1,78 +1,329 @@
 import fitz  # PyMuPDF for PDFs
 import docx
-import requests
+import httpx
+import os
+import re
+import functools
+import hashlib
+import logging
+import time
+from collections import deque
+from typing import NamedTuple
 from bs4 import BeautifulSoup
 from tempfile import NamedTemporaryFile
 import math
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
-
-def extract_text_from_url(file_url: str) -> str:
-    response = requests.get(file_url)
-    ext = file_url.split('?')[0].split('.')[-1].lower()
-
-    with NamedTemporaryFile(delete=False, suffix=f".{ext}") as f:
-        f.write(response.content)
-        f.flush()
-
-        if ext == "pdf":
-            doc = fitz.open(f.name)
-            return "\n".join([page.get_text() for page in doc])
-
-        elif ext == "docx":
-            doc = docx.Document(f.name)
-            return "\n".join([p.text for p in doc.paragraphs])
-
-        elif ext == "eml":
-            with open(f.name, "r", encoding="utf-8", errors="ignore") as email_file:
-                html = email_file.read()
-                soup = BeautifulSoup(html, "html.parser")
-                return soup.get_text(separator="\n")
-
-        else:
-            return "❌ Unsupported file format"
-
-def chunk_text(text: str, chunk_size: int = 200, overlap: int = 50) -> list:
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunks.append(" ".join(words[i:i + chunk_size]))
-    return chunks
-
-def chunk_text_parallel(text: str, chunk_size: int = 200, overlap: int = 50, num_threads: int = 4) -> list:
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from app.helpers.concurrency import stage_limit
+from app.helpers.metrics import stage_seconds
+
+logger = logging.getLogger(__name__)
+
+_async_client = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared async HTTP client so downloads reuse pooled connections."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(60.0, connect=10.0))
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+def get_extension(file_url: str) -> str:
+    return file_url.split('?')[0].split('.')[-1].lower()
+
+# Downloads larger than this are aborted instead of filling the disk
+MAX_DOCUMENT_BYTES = int(os.getenv("MAX_DOCUMENT_MB", "100")) * 1024 * 1024
+
+# DOCX has no page layout; paragraphs are grouped into pseudo-pages of this size
+DOCX_PARAGRAPHS_PER_PAGE = 50
+
+# PDFs with at least this many pages are parsed across a process pool
+PARALLEL_PDF_MIN_PAGES = int(os.getenv("PARALLEL_PDF_MIN_PAGES", "64"))
+PDF_PROCESSES = int(os.getenv("PDF_PROCESSES", str(os.cpu_count() or 1)))
+
+_process_pool = None
+
+class DocumentTooLargeError(ValueError):
+    pass
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the server process has live threads and torch state
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    """Drops a broken pool so the next large PDF starts a fresh one."""
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _extract_pdf_range(path: str, start: int, stop: int) -> list:
+    """Worker-side: each process opens its own fitz document."""
+    with fitz.open(path) as doc:
+        return [(i + 1, doc[i].get_text()) for i in range(start, stop)]
+
+def iter_pdf_pages_parallel(path: str, page_count: int):
+    """
+    Parses page ranges in the process pool and yields pages in order.
+    Ranges are smaller than page_count / workers so slow pages balance out.
+    If a worker process dies, the pool is replaced and the remaining pages
+    are parsed in this process.
+    """
+    range_size = max(1, math.ceil(page_count / (PDF_PROCESSES * 4)))
+    pool = get_process_pool()
+    futures = []
+    parsed = 0  # pages already yielded
+    try:
+        for start in range(0, page_count, range_size):
+            futures.append(pool.submit(_extract_pdf_range, path, start, min(start + range_size, page_count)))
+        for future in futures:
+            for page in future.result():
+                yield page
+                parsed += 1
+    except BrokenProcessPool:
+        logger.warning("⚠️ PDF worker process died; parsing pages %d+ in-process", parsed + 1)
+        _discard_process_pool(pool)
+        yield from _extract_pdf_range(path, parsed, page_count)
+    finally:
+        for future in futures:
+            future.cancel()
+
+def iter_pages(path: str, ext: str):
+    """
+    Yields (page_number, text) as parsing progresses, so chunking can start
+    before the whole document is parsed. Page numbers start at 1.
+    """
+    if ext == "pdf":
+        with fitz.open(path) as doc:
+            page_count = doc.page_count
+            if page_count < PARALLEL_PDF_MIN_PAGES or PDF_PROCESSES < 2:
+                for page in doc:
+                    yield page.number + 1, page.get_text()
+                return
+        yield from iter_pdf_pages_parallel(path, page_count)
+
+    elif ext == "docx":
+        doc = docx.Document(path)
+        paragraphs = [p.text for p in doc.paragraphs]
+        for i in range(0, len(paragraphs), DOCX_PARAGRAPHS_PER_PAGE):
+            yield i // DOCX_PARAGRAPHS_PER_PAGE + 1, "\n".join(paragraphs[i:i + DOCX_PARAGRAPHS_PER_PAGE])
+
+    elif ext == "eml":
+        with open(path, "r", encoding="utf-8", errors="ignore") as email_file:
+            html = email_file.read()
+            soup = BeautifulSoup(html, "html.parser")
+            yield 1, soup.get_text(separator="\n")
+
+    else:
+        yield 1, "❌ Unsupported file format"
+
+class PageRecord(NamedTuple):
+    page: int
+    hash: str    # sha256 of the page text
+    start: int   # character offset of the page in the document text
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def record_pages(pages, records: list):
+    """Passes (page_number, text) through, appending a PageRecord per page."""
+    offset = 0
+    for page_number, text in pages:
+        records.append(PageRecord(page_number, page_hash(text), offset))
+        offset += len(text) + 1
+        yield page_number, text
+
+def read_pages(path: str, ext: str, records: list = None) -> dict:
+    """All pages as {page_number: text}, optionally recording their hashes."""
+    pages = iter_pages(path, ext)
+    if records is not None:
+        pages = record_pages(pages, records)
+    return dict(pages)
+
+class _NotModified(Exception):
+    pass
+
+class DownloadedDocument(NamedTuple):
+    path: str
+    ext: str
+    content_hash: str
+    etag: str = None
+    last_modified: str = None
+
+async def download_document(file_url: str, etag: str = None, last_modified: str = None):
+    """
+    Streams a document to a temp file, hashing it on the way and enforcing
+    MAX_DOCUMENT_BYTES. The caller owns the temp file and must remove it.
+
+    With etag/last_modified the request is conditional, and None is
+    returned when the server answers 304 Not Modified.
+    """
+    ext = get_extension(file_url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    digest = hashlib.sha256()
+    size = 0
+    f = NamedTemporaryFile(delete=False, suffix=f".{ext}")
+    try:
+        with f:
+            async with stage_limit("download"):
+                async with get_async_client().stream("GET", file_url, headers=headers) as response:
+                    if response.status_code == 304:
+                        raise _NotModified()
+                    response.raise_for_status()
+                    validators = response.headers.get("etag"), response.headers.get("last-modified")
+                    async for block in response.aiter_bytes(1024 * 1024):
+                        size += len(block)
+                        if size > MAX_DOCUMENT_BYTES:
+                            raise DocumentTooLargeError(f"Document exceeds {MAX_DOCUMENT_BYTES} bytes")
+                        digest.update(block)
+                        f.write(block)
+    except _NotModified:
+        os.remove(f.name)
+        return None
+    except BaseException:
+        os.remove(f.name)
+        raise
+    return DownloadedDocument(f.name, ext, digest.hexdigest(), *validators)
+
+class ChunkSpan(NamedTuple):
+    start: int      # character offset into the document text (pages joined by "\n")
+    end: int
+    page: int       # page the chunk starts on
+    end_page: int   # page the chunk ends on
+    tokens: int     # bge tokenizer tokens, excluding [CLS]/[SEP]
+
+# Same tokenizer as the embedding model, and its per-input limit minus [CLS]/[SEP]
+TOKENIZER_NAME = "BAAI/bge-small-en-v1.5"
+MAX_MODEL_TOKENS = 510
+
+WORD_RE = re.compile(r"\S+")
+
+_tokenizer = None
+
+def count_word_tokens(word: str) -> int:
+    """
+    WordPiece splits on whitespace before anything else, so per-word counts
+    add up exactly to the token count of the joined text.
     """
-    Split text into chunks using parallel processing for large documents
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+
+        _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+    return _count_word_tokens(word)
+
+@functools.lru_cache(maxsize=200_000)
+def _count_word_tokens(word: str) -> int:
+    return len(_tokenizer.encode(word, add_special_tokens=False))
+
+def iter_chunk_spans(pages, chunk_size: int = 200, overlap: int = 50, unit: str = "words", count_tokens=None):
     """
-    words = text.split()
-    total_words = len(words)
-    
-    # If document is small, use regular chunking
-    if total_words < 1000:
-        return chunk_text(text, chunk_size, overlap)
-    
-    # Calculate words per thread
-    words_per_thread = math.ceil(total_words / num_threads)
-    
-    def process_segment(start_idx, end_idx):
-        segment_words = words[start_idx:end_idx]
-        segment_text = " ".join(segment_words)
-        return chunk_text(segment_text, chunk_size, overlap)
-    
-    # Create thread segments with overlap to maintain context
-    segments = []
-    for i in range(num_threads):
-        start_idx = i * words_per_thread
-        end_idx = min((i + 1) * words_per_thread + overlap, total_words)
-        if start_idx < total_words:
-            segments.append((start_idx, end_idx))
-    
-    # Process segments in parallel
-    all_chunks = []
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(process_segment, start, end) for start, end in segments]
-        
-        for future in concurrent.futures.as_completed(futures):
-            chunks = future.result()
-            all_chunks.extend(chunks)
-    
-    return all_chunks
\ No newline at end of file
+    Single pass over word offsets of an iterable of (page_number, text).
+    Yields (ChunkSpan, text) in document order. Consecutive chunks share
+    `overlap` units, but no chunk is a subset of another.
+
+    unit="words" sizes chunks in words, unit="tokens" in tokenizer tokens
+    (chunk_size is then capped at MAX_MODEL_TOKENS).
+    """
+    if unit not in ("words", "tokens"):
+        raise ValueError(f"Unknown chunk unit: {unit}")
+    if unit == "tokens":
+        chunk_size = min(chunk_size, MAX_MODEL_TOKENS)
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    count_tokens = count_tokens or count_word_tokens
+
+    window = deque()  # (start, end, page, tokens) per word
+    size = 0          # window size in `unit`
+    unseen = 0        # words in the window not covered by an emitted chunk
+    text_buffer = ""  # document text from text_offset on, enough to slice the window
+    text_offset = 0
+    offset = 0
+
+    def emit():
+        start, end = window[0][0], window[-1][1]
+        span = ChunkSpan(start, end, window[0][2], window[-1][2], sum(w[3] for w in window))
+        return span, text_buffer[start - text_offset:end - text_offset]
+
+    for page_number, text in pages:
+        text_buffer += text + "\n"
+        for match in WORD_RE.finditer(text):
+            tokens = count_tokens(match.group())
+            weight = tokens if unit == "tokens" else 1
+            if window and size + weight > chunk_size:
+                yield emit()
+                unseen = 0
+                while window and size > overlap:
+                    dropped = window.popleft()
+                    size -= dropped[3] if unit == "tokens" else 1
+            window.append((offset + match.start(), offset + match.end(), page_number, tokens))
+            size += weight
+            unseen += 1
+        offset += len(text) + 1
+        # Drop text that no longer backs any word in the window
+        keep_from = window[0][0] if window else offset
+        text_buffer = text_buffer[keep_from - text_offset:]
+        text_offset = keep_from
+
+    if unseen:
+        yield emit()
+
+def iter_chunk_batches(path: str, ext: str, batch_size: int = 256, chunk_size: int = 200,
+                       overlap: int = 50, unit: str = "words", page_records: list = None):
+    """
+    Yields lists of (ChunkSpan, text) while the document is still being parsed.
+    If page_records is given, a PageRecord is appended to it for every page.
+    Parsing and chunking are interleaved, so their times are accumulated
+    separately and recorded as the "parse" and "chunk" stages.
+    """
+    parse_seconds, total_seconds = [0.0], [0.0]
+    pages = _timed(iter_pages(path, ext), parse_seconds)
+    if page_records is not None:
+        pages = record_pages(pages, page_records)
+    batch = []
+    try:
+        for chunk in _timed(iter_chunk_spans(pages, chunk_size, overlap, unit), total_seconds):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        stage_seconds.observe(parse_seconds[0], stage="parse")
+        stage_seconds.observe(total_seconds[0] - parse_seconds[0], stage="chunk")
+
+def _timed(iterable, seconds: list):
+    """Passes items through, adding the time spent producing them to seconds[0]."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            seconds[0] += time.perf_counter() - start
+        yield item
@@ -1,2 +1,38 @@
-def get_similar_contexts(vector_store, question: str, k: int = 8):
-    return vector_store.similarity_search(question, k=5, fetch_k=10)
+import os
+import numpy as np
+from app.helpers.embedder import EMBEDDING_MODEL_NAME, encode_texts
+from app.helpers.memory_cache import LRUCache
+from app.helpers.metrics import record_cache
+
+# Chunks retrieved per question
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+
+# Embeddings of recently asked (normalized) questions, shared across requests
+query_cache = LRUCache(
+    max_entries=int(os.getenv("QUERY_CACHE_ENTRIES", "10000")),
+    max_bytes=int(os.getenv("QUERY_CACHE_MB", "64")) * 1024 * 1024,
+)
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+def embed_questions(questions: list[str]) -> np.ndarray:
+    """Embeds all questions in one encoder call, serving repeats from the LRU."""
+    keys = [(EMBEDDING_MODEL_NAME, normalize_question(q)) for q in questions]
+    cached = [query_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    record_cache("query", len(keys) - len(missing), len(missing))
+    if missing:
+        # Duplicates within the request are encoded once
+        unique = list(dict.fromkeys(keys[i][1] for i in missing))
+        encoded = dict(zip(unique, encode_texts(unique)))
+        for i in missing:
+            cached[i] = encoded[keys[i][1]]
+            query_cache.put(keys[i], cached[i], cached[i].nbytes)
+    return np.vstack(cached).astype("float32", copy=False)
+
+def get_similar_contexts_batch(vector_store, questions: list[str], k: int = RETRIEVAL_K):
+    """One encoder call and one batched index search for all questions."""
+    if not questions:
+        return []
+    return vector_store.search_batch(embed_questions(questions), k)
@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from filelock import FileLock, Timeout
+
+logger = logging.getLogger(__name__)
+
+# Lock files are named by this many hex chars of the key's sha1, so at most
+# 16**3 of them ever exist. Deleting them after use instead would be racy:
+# a waiter can still hold the unlinked file open and lock it while a
+# newcomer locks a fresh one.
+LOCK_NAME_CHARS = 3
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one execution.
+
+    Inside a process, later callers await the task started by the first one.
+    Across worker processes, the running task holds a lock file in lock_dir,
+    so other processes wait for it and then find the result in the cache
+    (fn is expected to check the cache before doing any work). Keys share
+    lock files by hash prefix, so an unrelated key now and then waits too.
+    """
+
+    def __init__(self, lock_dir: str, lock_timeout: float = 600.0, poll_interval: float = 0.1):
+        self.lock_dir = lock_dir
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._inflight = {}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    async def do(self, key: str, fn):
+        """Runs fn() (a coroutine function) once per key among concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_locked(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one cancelled caller must not cancel the shared work
+        return await asyncio.shield(task)
+
+    async def _run_locked(self, key: str, fn):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:LOCK_NAME_CHARS]
+        lock = FileLock(os.path.join(self.lock_dir, f"{name}.lock"))
+        waited = 0.0
+        while True:
+            try:
+                lock.acquire(blocking=False)
+                break
+            except Timeout:
+                if waited >= self.lock_timeout:
+                    # Holder looks stuck; do the work ourselves rather than fail
+                    logger.warning("⚠️ Lock for %s held for %.0fs, proceeding without it", key, waited)
+                    return await fn()
+                await asyncio.sleep(self.poll_interval)
+                waited += self.poll_interval
+        try:
+            return await fn()
+        finally:
+            lock.release()
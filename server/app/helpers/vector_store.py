@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from app.helpers.index_factory import apply_search_params
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+
+# Flat indexes are mapped straight from the file (no copy into the heap), so
+# every worker process shares the same pages through the OS page cache.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _read_index(path: str):
+    try:
+        return faiss.read_index(path, MMAP_FLAGS)
+    except RuntimeError:
+        # Index types without mmap support are read into memory instead
+        return faiss.read_index(path)
+
+
+def _row_document(row) -> Document:
+    # chunk_id is the chunk's position in the document, so consecutive ids are adjacent
+    return Document(
+        page_content=row[1],
+        metadata={**(json.loads(row[2]) if row[2] else {}), "chunk_id": row[0]},
+    )
+
+
+class VectorStore:
+    """
+    Read-only vector store backed by a native FAISS index file and a SQLite
+    sidecar holding chunk text + metadata. Row ids in the sidecar are the
+    FAISS ids, so a search only fetches the rows it returns.
+    """
+
+    def __init__(self, index, conn: sqlite3.Connection, path: str = None):
+        self.index = index
+        self.path = path
+        # Objects are stored under their document's content hash
+        self.content_hash = os.path.basename(path) if path else None
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "VectorStore":
+        index = apply_search_params(_read_index(os.path.join(path, INDEX_FILE)))
+        # Objects are content-addressed and never modified after publishing
+        conn = sqlite3.connect(
+            f"file:{os.path.join(path, CHUNKS_FILE)}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False,
+        )
+        return cls(index, conn, path)
+
+    @staticmethod
+    def write(path: str, index, documents: list[Document], pages: list = None):
+        """
+        Writes the index and chunk sidecar into an (empty) directory. pages
+        (PageRecords) are kept so a changed document can be updated page by page.
+        """
+        faiss.write_index(index, os.path.join(path, INDEX_FILE))
+        conn = sqlite3.connect(os.path.join(path, CHUNKS_FILE))
+        try:
+            conn.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT)")
+            conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                (
+                    (i, doc.page_content, json.dumps(doc.metadata) if doc.metadata else None)
+                    for i, doc in enumerate(documents)
+                ),
+            )
+            conn.execute("CREATE TABLE pages (page INTEGER PRIMARY KEY, hash TEXT NOT NULL, start INTEGER NOT NULL)")
+            conn.executemany("INSERT INTO pages (page, hash, start) VALUES (?, ?, ?)", pages or [])
+            conn.commit()
+        finally:
+            conn.close()
+
+    @property
+    def nbytes(self) -> int:
+        """On-disk size of the store, used as its weight in the memory cache."""
+        if self.path is None:
+            return self.index.ntotal * self.index.d * 4
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in (INDEX_FILE, CHUNKS_FILE)
+        )
+
+    def _fetch(self, ids) -> dict:
+        """Reads chunks by FAISS id from the sidecar; returns {id: Document}."""
+        ids = list(dict.fromkeys(int(i) for i in ids if i >= 0))
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", ids
+            ).fetchall()
+        return {row[0]: _row_document(row) for row in rows}
+
+    def page_records(self) -> list:
+        """PageRecords of the document; empty for stores written before they were kept."""
+        from app.helpers.processor import PageRecord
+
+        with self._lock:
+            try:
+                rows = self._conn.execute("SELECT page, hash, start FROM pages ORDER BY page").fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [PageRecord(*row) for row in rows]
+
+    def all_documents(self) -> list[Document]:
+        """Every chunk in document order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, text, metadata FROM chunks ORDER BY id").fetchall()
+        return [_row_document(row) for row in rows]
+
+    def reconstruct(self, ids):
+        """
+        Stored vectors for ids, or None when the index keeps only lossy codes
+        (IVF-PQ) and the vectors have to be recomputed.
+        """
+        if not isinstance(self.index, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+            return None
+        if not len(ids):
+            return np.empty((0, self.index.d), dtype="float32")
+        return self.index.reconstruct_n(0, self.index.ntotal)[np.asarray(ids, dtype="int64")]
+
+    def search_batch(self, queries: np.ndarray, k: int = 4) -> list[list[Document]]:
+        """One index.search over the query matrix, one sidecar read for all hits."""
+        _, ids = self.index.search(np.ascontiguousarray(queries, dtype="float32"), k)
+        by_id = self._fetch(ids.ravel().tolist())
+        return [[by_id[i] for i in row if i in by_id] for row in ids.tolist()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import time
+
+from app.helpers.concurrency import run_in_stage
+from app.helpers.metrics import ready, startup_seconds
+
+logger = logging.getLogger(__name__)
+
+# Process start as seen by app.main (set before its imports)
+STARTED_AT = time.perf_counter()
+
+# A failed warm-up (e.g. a transient Hugging Face Hub error) is retried with
+# exponential backoff, from WARMUP_RETRY_SECONDS up to WARMUP_RETRY_MAX_SECONDS
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+
+# Readiness of this worker process, reported by /ready
+state = {
+    "ready": False,
+    "error": None,
+    "attempts": 0,
+    "preloaded": False,
+    "import_seconds": None,
+    "warmup_seconds": None,
+    "time_to_ready_seconds": None,
+}
+
+_task = None
+
+
+def mark_imported(started_at: float):
+    """Records how long app.main took to import, from its first line."""
+    global STARTED_AT
+    STARTED_AT = started_at
+    seconds = time.perf_counter() - STARTED_AT
+    state["import_seconds"] = round(seconds, 3)
+    startup_seconds.set(seconds, phase="import")
+    logger.info("App imported in %.2fs", seconds)
+
+
+def preload():
+    """
+    Loads the embedding model weights in the parent process, before a
+    pre-forking server (gunicorn --preload) forks its workers, so they share
+    the weights copy-on-write. No inference runs here: torch's thread pools
+    do not survive fork, so the warm-up encode is left to each worker.
+    """
+    from app.helpers.embedder import get_embedding_model
+
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    start = time.perf_counter()
+    get_embedding_model()
+    seconds = time.perf_counter() - start
+    state["preloaded"] = True
+    startup_seconds.set(seconds, phase="preload")
+    logger.info("Embedding model preloaded in %.2fs", seconds)
+
+
+def warm_up():
+    """
+    Blocking: loads the embedding model, the chunk tokenizer and the Gemini
+    client, and runs one encode so the first request doesn't pay for lazy
+    initialisation inside torch.
+    """
+    from app.helpers.embedder import encode_texts, get_embedding_cache
+    from app.helpers.llm_reasoner import get_model
+    from app.helpers.processor import count_word_tokens
+
+    encode_texts(["warm-up"])
+    count_word_tokens("warm-up")
+    get_embedding_cache()
+    get_model()
+
+
+async def _run():
+    start = time.perf_counter()
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        state["attempts"] += 1
+        try:
+            await run_in_stage("embed", warm_up)
+            break
+        except Exception as e:
+            # Requests still load everything lazily meanwhile
+            state["error"] = f"{type(e).__name__}: {e}"
+            logger.exception("Warm-up attempt %d failed; retrying in %.1fs", state["attempts"], delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    state["error"] = None
+    state["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    state["time_to_ready_seconds"] = round(time.perf_counter() - STARTED_AT, 3)
+    state["ready"] = True
+    startup_seconds.set(time.perf_counter() - start, phase="warmup")
+    startup_seconds.set(time.perf_counter() - STARTED_AT, phase="ready")
+    ready.set(1)
+    logger.info(
+        "Ready in %.2fs (warm-up %.2fs)", state["time_to_ready_seconds"], state["warmup_seconds"]
+    )
+
+
+def start():
+    """Starts the warm-up in the background; call from the app lifespan."""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
+    return _task
+
+
+async def stop():
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+
+
+def is_ready() -> bool:
+    return state["ready"]
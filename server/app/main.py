@@ -1,33 +1,55 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes import query_retrieval
+from app.helpers.concurrency import shutdown_executors
+from app.helpers import metrics, warmup
+from app.helpers.processor import close_async_client, shutdown_process_pool
+from app.services.document_processor import ingest_queue
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 import json
+import logging
 import re
 import os
 
 load_dotenv()
 
+# LOG_LEVEL=DEBUG also logs request bodies, questions and per-stage spans
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("app").setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+warmup.mark_imported(_import_started)
+
+# PRELOAD_MODELS=1 loads the embedding model at import, so with
+# `gunicorn --preload -k uvicorn.workers.UvicornWorker` the workers forked
+# afterwards share one copy of the weights
+if os.getenv("PRELOAD_MODELS", "0") == "1":
+    warmup.preload()
+
 class FixQuotesMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
-        if request.url.path == "/api/v1/hackrx/run" and request.method == "POST":
+        if request.url.path in ("/api/v1/hackrx/run", "/api/v1/hackrx/run/stream") and request.method == "POST":
             # Read the raw body
             body = await request.body()
             body_str = body.decode('utf-8')
             
-            print(f"🔍 DEBUG: Original body: {body_str[:200]}...")
+            logger.debug("🔍 Original body: %.200s...", body_str)
             
             try:
                 # Try to parse as normal JSON first
                 json.loads(body_str)
-                print("✅ DEBUG: Valid JSON, no fixing needed")
             except json.JSONDecodeError:
-                print("🔧 DEBUG: Invalid JSON detected, attempting to fix...")
+                logger.debug("🔧 Invalid JSON detected, attempting to fix...")
                 
                 # Fix the quotes issue
                 fixed_body = self.fix_json_quotes(body_str)
-                print(f"🔧 DEBUG: Fixed body: {fixed_body[:200]}...")
+                logger.debug("🔧 Fixed body: %.200s...", fixed_body)
                 
                 # Replace the request body
                 request._body = fixed_body.encode('utf-8')
@@ -44,7 +66,7 @@ class FixQuotesMiddleware(BaseHTTPMiddleware):
             
             if match:
                 questions_array = match.group(1)
-                print(f"🎯 DEBUG: Found questions array")
+                logger.debug("🎯 Found questions array")
                 
                 # Parse each question individually based on its wrapper quotes
                 questions = []
@@ -94,8 +116,7 @@ class FixQuotesMiddleware(BaseHTTPMiddleware):
                     else:
                         i += 1
                 
-                print(f"📝 DEBUG: Extracted {len(questions)} questions")
-                print(f"📝 DEBUG: First question: {questions[0] if questions else 'None'}")
+                logger.debug("📝 Extracted %d questions", len(questions))
                 
                 # Rebuild as proper JSON array with double quotes
                 fixed_questions = []
@@ -113,15 +134,50 @@ class FixQuotesMiddleware(BaseHTTPMiddleware):
             return body_str
             
         except Exception as e:
-            print(f"❌ DEBUG: Error fixing quotes: {e}")
+            logger.warning("❌ Error fixing quotes: %s", e)
             return body_str
 
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Request latency and status counts per route, and in-flight requests."""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in ("/metrics", "/ready"):
+            return await call_next(request)
+        start = time.perf_counter()
+        status = 500
+        metrics.requests_in_flight.inc()
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.requests_in_flight.dec()
+            # Route template (e.g. /ingest/{job_id}) keeps label cardinality bounded
+            route = request.scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            metrics.request_seconds.observe(time.perf_counter() - start, path=label)
+            metrics.requests_total.inc(path=label, status=status)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ingest_queue.start()
+    # Models load in the background; /ready reports 503 until they have
+    warmup.start()
+    yield
+    await warmup.stop()
+    await ingest_queue.stop()
+    # Release pooled connections, the per-stage thread pools and PDF workers
+    await close_async_client()
+    shutdown_executors()
+    shutdown_process_pool()
+
 app = FastAPI(
     title="LLM-Powered Query Retrieval System",
     description="Intelligent document processing and query system for insurance, legal, and compliance domains",
     version="1.0.0",
     docs_url="/aai",
-    redoc_url="/reaai"
+    redoc_url="/reaai",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -135,6 +191,7 @@ app.add_middleware(
 
 # Add the quote fixing middleware
 app.add_middleware(FixQuotesMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(query_retrieval.router, prefix="/api/v1/hackrx", tags=["Query Retrieval"])
 
@@ -152,3 +209,16 @@ async def health_check():
     """Health check endpoint for Google Cloud Run"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the models are loaded and warmed up"""
+    body = {**warmup.state, "ingest_queue": ingest_queue.running}
+    if warmup.is_ready() and ingest_queue.running:
+        return {"status": "ready", **body}
+    return JSONResponse({"status": "starting", **body}, status_code=503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (per worker process)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
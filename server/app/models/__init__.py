@@ -1,2 +1,2 @@
-from .schemas import QueryRequest, QueryResponse
-__all__ = ["QueryRequest", "QueryResponse"]
\ No newline at end of file
+from .schemas import IngestJobStatus, IngestRequest, IngestResponse, QueryRequest, QueryResponse
+__all__ = ["IngestJobStatus", "IngestRequest", "IngestResponse", "QueryRequest", "QueryResponse"]
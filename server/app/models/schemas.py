@@ -1,9 +1,25 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Union
 
 class QueryRequest(BaseModel):
     documents: str
     questions: List[str]
 
 class QueryResponse(BaseModel):
-    answers: List[str]
\ No newline at end of file
+    answers: List[str]
+
+class IngestRequest(BaseModel):
+    documents: Union[str, List[str]]
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    url: str
+    status: str
+    content_hash: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class IngestResponse(BaseModel):
+    jobs: List[IngestJobStatus]
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import QueryRequest, QueryResponse
-from app.services.document_processor import DocumentProcessorService
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.models.schemas import IngestJobStatus, IngestRequest, IngestResponse, QueryRequest, QueryResponse
+from app.services.document_processor import DocumentProcessorService, ingest_queue
+from app.services.ingest_queue import QueueFullError
+from contextlib import aclosing
+import json
 import time
 import logging
 import uuid
@@ -14,4 +18,60 @@ router = APIRouter()
 async def run_query(req: QueryRequest):
     processor_service = DocumentProcessorService()
     answers = await processor_service.process_document_and_questions(req.documents, req.questions)
-    return QueryResponse(answers=answers)
\ No newline at end of file
+    return QueryResponse(answers=answers)
+
+@router.post("/run/stream")
+async def run_query_stream(req: QueryRequest, request: Request, format: str = None):
+    """
+    Streaming variant of /run: progress events, then each answer with its
+    question index as soon as its batch is done. NDJSON by default;
+    server-sent events with ?format=sse or Accept: text/event-stream.
+    """
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+
+    async def events():
+        processor_service = DocumentProcessorService()
+        stream = processor_service.stream_document_and_questions(req.documents, req.questions)
+        async with aclosing(stream):
+            try:
+                async for event in stream:
+                    yield encode_event(event, format)
+            except Exception as e:
+                logger.exception("Streaming run failed")
+                yield encode_event({"event": "error", "detail": str(e)}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # X-Accel-Buffering: stop nginx-style proxies from holding events back
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/ingest", response_model=IngestResponse, status_code=202)
+async def ingest_documents(req: IngestRequest):
+    """
+    Queues documents for background ingestion so later /run calls hit the
+    vector cache. Returns one job per URL; 429 when the queue is full.
+    """
+    urls = [req.documents] if isinstance(req.documents, str) else req.documents
+    if not urls:
+        raise HTTPException(status_code=400, detail="documents must not be empty")
+    processor_service = DocumentProcessorService()
+    try:
+        jobs = processor_service.submit_ingest(urls)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return IngestResponse(jobs=[IngestJobStatus(**job.to_dict()) for job in jobs])
+
+@router.get("/ingest/{job_id}", response_model=IngestJobStatus)
+async def ingest_status(job_id: str):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job (jobs are tracked per server process)")
+    return IngestJobStatus(**job.to_dict())
+
+def encode_event(event: dict, format: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if format == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
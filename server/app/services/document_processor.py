@@ -1,43 +1,367 @@
-from app.helpers.processor import extract_text_from_url, chunk_text_parallel, chunk_text
-from app.helpers.embedder import embed_chunks_parallel, embed_chunks
-from app.helpers.retriever import get_similar_contexts
-from app.helpers.llm_reasoner import generate_batch_answer
-from app.helpers.cache_manager import load_vector_store_if_exists, save_vector_store
+from app.helpers.processor import DocumentTooLargeError, download_document, iter_chunk_batches, read_pages
+from app.helpers.embedder import ChunkEmbedder
+from app.helpers.page_diff import plan_page_update, rechunk_runs
+from app.helpers.index_factory import describe_index
+from app.helpers.retriever import embed_questions, get_similar_contexts_batch
+from app.helpers.llm_reasoner import ANSWER_VERSION, FAILED_ANSWER, AnswerStats, answer_batch, plan_batches
+from app.helpers.answer_cache import AnswerCache
+from app.helpers.cache_manager import (
+    CACHE_DIR, is_stale, load_vector_store_if_exists, load_vector_store, lookup_url, mark_validated,
+    normalize_url, record_url, save_vector_store,
+)
+from app.helpers.concurrency import iterate_in_stage, run_in_stage
+from app.helpers.metrics import ingest_queue_depth, ingested_chunks, ingested_tokens, record_cache, span, stage_seconds
+from app.helpers.singleflight import SingleFlight
+from app.services.ingest_queue import IngestQueue
+import asyncio
+import httpx
+import logging
+import numpy as np
+import os
+from contextlib import aclosing
 import time
 
+logger = logging.getLogger(__name__)
+
+# Chunking: CHUNK_UNIT=tokens sizes chunks with the bge tokenizer instead of words
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "words")
+CHUNK_BATCH_SIZE = 256
+
+# Final answers per (document, normalized question, prompt/model version).
+# ANSWER_SIMILARITY_THRESHOLD (cosine, e.g. 0.95) also reuses answers of
+# near-duplicate questions; unset means exact matches only.
+answer_cache = None
+if os.getenv("ANSWER_CACHE", "1") != "0":
+    answer_cache = AnswerCache(
+        os.path.join(CACHE_DIR, "answers.sqlite"),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600))),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "100000")),
+    )
+ANSWER_SIMILARITY_THRESHOLD = (
+    float(os.environ["ANSWER_SIMILARITY_THRESHOLD"]) if os.getenv("ANSWER_SIMILARITY_THRESHOLD") else None
+)
+
+# One ingest per document at a time, within this process and across workers
+ingest_flight = SingleFlight(
+    os.path.join(CACHE_DIR, "locks"),
+    lock_timeout=float(os.getenv("INGEST_LOCK_TIMEOUT", "600")),
+)
+
+async def ingest_document(document_url: str):
+    """Cache lookup (with revalidation) + single-flight ingest; what every ingest job runs."""
+    service = DocumentProcessorService()
+    db = await service._cached_store(document_url)
+    if db is not None:
+        return db
+    return await ingest_flight.do(normalize_url(document_url), lambda: service._load_or_ingest(document_url))
+
+# Pre-ingestion jobs run on INGEST_WORKERS workers, at most INGEST_QUEUE_SIZE
+# pending at once, and only get BACKGROUND_LIMITS of the extract/embed stages.
+# Query-time misses don't wait for a worker: they ingest directly under the
+# full stage limits, joining a running job via single-flight (at that job's
+# background limits).
+ingest_queue = IngestQueue(
+    ingest_document,
+    workers=int(os.getenv("INGEST_WORKERS", "2")),
+    maxsize=int(os.getenv("INGEST_QUEUE_SIZE", "100")),
+)
+ingest_queue_depth.set_function(lambda: {(): ingest_queue.stats()["queued"]})
+
+# Fire-and-forget work (answer cache writes); the loop only keeps weak
+# references to tasks, so they are held here until done
+_background_tasks = set()
+
+def _in_background(coro):
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
 class DocumentProcessorService:
     async def process_document_and_questions(self, document_url: str, questions: list) -> list:
+        answers = [None] * len(questions)
+        async with aclosing(self.stream_document_and_questions(document_url, questions)) as events:
+            async for event in events:
+                if event["event"] == "answer":
+                    answers[event["index"]] = event["answer"]
+        return answers
+
+    async def stream_document_and_questions(self, document_url: str, questions: list):
+        """
+        Runs the pipeline and yields progress events as dicts:
+          {"event": "vector_cache", "hit": bool}
+          {"event": "ingest_done", "seconds": float}               (on a miss)
+          {"event": "answer_cache", "hits": int, "total": int}
+          {"event": "answer", "index": int, "answer": str, "cached": bool}
+          {"event": "done", "seconds": float}
+        Answers are emitted as soon as their batch finishes, not in order.
+        """
         start=time.time()
-        print(f"🚀 DEBUG: Validated request received")
-        print(f"📄 Document URL: {document_url}")
-        print(f"❓ Questions: {questions}")
-        print(f"❓ Questions count: {len(questions) if hasattr(questions, '__len__') else 'N/A'}")
-        print(f"❓ First few questions: {questions[:2] if len(questions) > 0 else 'None'}")
+        logger.debug("📄 Document URL: %s", document_url)
+        logger.debug("❓ %d questions: %s", len(questions), questions)
 
-        # Use the URL directly to load/save cache
-        db = load_vector_store_if_exists(document_url)
+        with span("cache_load"):
+            db = await self._cached_store(document_url)
+        record_cache("vector_store", int(db is not None), int(db is None))
+        yield {"event": "vector_cache", "hit": db is not None}
 
         if db is not None:
-            print("✅ Using cached vector store.")
+            logger.info("✅ Using cached vector store.")
         else:
-            print("📥 Downloading and embedding new document.")
-            raw_text = extract_text_from_url(document_url)
-            # chunks = chunk_text(raw_text)
-            chunks = chunk_text_parallel(raw_text, num_threads=4)
-            # db = embed_chunks(chunks)
-            db = embed_chunks_parallel(chunks, batch_size=50, num_threads=4)
-            save_vector_store(db, document_url)
-
-        # Batch Question Processing
-        batch_size = 5
-        answers = []
-
-        for i in range(0, len(questions), batch_size):
-            question_batch = questions[i:i + batch_size]
-            contexts = [get_similar_contexts(db, q) for q in question_batch]
-            batch_answers = generate_batch_answer(contexts, question_batch)
-            answers.extend(batch_answers)
-        
+            with span("ingest"):
+                db = await self._ingest_for_query(document_url)
+            yield {"event": "ingest_done", "seconds": round(time.time() - start, 3)}
+
+        with span("answer_cache"):
+            cached = await self._cached_answers(db.content_hash, questions)
+        record_cache("answer", len(cached), len(questions) - len(cached))
+        logger.info("💾 Answer cache: %d/%d hits", len(cached), len(questions))
+        yield {"event": "answer_cache", "hits": len(cached), "total": len(questions)}
+        for i, answer in sorted(cached.items()):
+            yield {"event": "answer", "index": i, "answer": answer, "cached": True}
+
+        pending = [i for i in range(len(questions)) if i not in cached]
+        if pending:
+            async with aclosing(self._answer_stream(db, [questions[i] for i in pending])) as fresh:
+                async for j, answer in fresh:
+                    yield {"event": "answer", "index": pending[j], "answer": answer, "cached": False}
+
         stop=time.time()
-        print(f"🕒 Total Time: {stop - start:.2f} seconds")
-        return answers
\ No newline at end of file
+        stage_seconds.observe(stop - start, stage="total")
+        logger.info("🕒 Total Time: %.2f seconds", stop - start)
+        yield {"event": "done", "seconds": round(stop - start, 3)}
+
+    async def _answer_stream(self, db, questions: list):
+        """
+        Retrieval + LLM for questions the answer cache couldn't serve.
+        Yields (position, answer) pairs batch by batch as they complete.
+        """
+        # One encoder call + one batched index search for every question
+        with span("retrieval", questions=len(questions)):
+            contexts = await run_in_stage("retrieve", get_similar_contexts_batch, db, questions)
+
+        # Batch Question Processing: questions are grouped by estimated prompt
+        # size; all batches go out concurrently and the scheduler enforces
+        # the shared RPM/TPM budget
+        stats = AnswerStats()
+        batches = plan_batches(contexts, questions)
+
+        async def run_batch(batch):
+            batch_answers = await answer_batch(
+                [contexts[i] for i in batch], [questions[i] for i in batch], stats
+            )
+            return batch, batch_answers
+
+        tasks = [asyncio.ensure_future(run_batch(batch)) for batch in batches]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                batch, batch_answers = await next_done
+                # The cache write must not hold up (or fail) the answers
+                _in_background(self._store_answers(db.content_hash, [questions[i] for i in batch], batch_answers))
+                for i, answer in zip(batch, batch_answers):
+                    yield i, answer
+        finally:
+            # Client went away or a batch failed: don't leave LLM calls running
+            for task in tasks:
+                task.cancel()
+
+        logger.info(
+            "🤖 %d batches, %d LLM calls, %d retried / %d failed questions",
+            len(batches), stats.llm_calls, stats.retried_questions, stats.failed_questions,
+        )
+        logger.info("✂️ Context packing saved ~%d/%d prompt tokens", stats.tokens_saved, stats.naive_tokens)
+
+    async def _store_answers(self, doc_hash: str, questions: list, answers: list):
+        """Best effort: a failed write is logged, the answers were already sent."""
+        answered = [i for i, answer in enumerate(answers) if answer != FAILED_ANSWER]
+        if not answered or answer_cache is None:
+            return
+        try:
+            vectors = await run_in_stage("retrieve", embed_questions, [questions[i] for i in answered])
+            await run_in_stage(
+                "cache", answer_cache.put_many, doc_hash, ANSWER_VERSION,
+                [questions[i] for i in answered], [answers[i] for i in answered], vectors,
+            )
+        except Exception as e:
+            logger.warning("⚠️ Could not cache %d answers: %s", len(answered), e)
+
+    async def _cached_answers(self, doc_hash: str, questions: list) -> dict:
+        """{position: answer} from exact matches, then near-duplicate questions."""
+        if answer_cache is None:
+            return {}
+        cached = await run_in_stage("cache", answer_cache.get_many, doc_hash, questions, ANSWER_VERSION)
+        pending = [i for i in range(len(questions)) if i not in cached]
+        if pending and ANSWER_SIMILARITY_THRESHOLD is not None:
+            vectors = await run_in_stage("retrieve", embed_questions, [questions[i] for i in pending])
+            similar = await run_in_stage(
+                "cache", answer_cache.get_similar, doc_hash, ANSWER_VERSION, vectors, ANSWER_SIMILARITY_THRESHOLD
+            )
+            cached.update((pending[j], answer) for j, answer in similar.items())
+        return cached
+
+    def submit_ingest(self, document_urls: list) -> list:
+        """Queues background ingests; raises QueueFullError once the queue is full."""
+        return ingest_queue.submit_many(document_urls)
+
+    async def _ingest_for_query(self, document_url: str):
+        # Joins an ingest that is already running (e.g. a pre-ingestion job)
+        return await ingest_flight.do(normalize_url(document_url), lambda: self._load_or_ingest(document_url))
+
+    async def _cached_store(self, document_url: str):
+        """Cached store for the URL, revalidated against the origin once it's stale."""
+        entry = await run_in_stage("cache", lookup_url, document_url)
+        if entry is None:
+            return None
+        db = await run_in_stage("cache", load_vector_store, entry.content_hash)
+        if db is None or not is_stale(entry):
+            return db
+        return await ingest_flight.do(normalize_url(document_url), lambda: self._revalidate(document_url))
+
+    async def _revalidate(self, document_url: str):
+        """
+        Conditional GET with the stored ETag/Last-Modified: a 304 costs one
+        round-trip; a changed document only has its changed pages re-embedded.
+        """
+        entry = await run_in_stage("cache", lookup_url, document_url)
+        db = await run_in_stage("cache", load_vector_store, entry.content_hash) if entry else None
+        if db is None:
+            return await self._ingest(document_url)
+        if not is_stale(entry):
+            return db  # revalidated by a concurrent request meanwhile
+
+        try:
+            with span("revalidate"):
+                document = await download_document(document_url, entry.etag, entry.last_modified)
+        except (httpx.HTTPError, DocumentTooLargeError) as e:
+            logger.warning("⚠️ Revalidation failed (%s); using cached vector store.", e)
+            return db
+        if document is None:
+            await run_in_stage("cache", mark_validated, document_url)
+            logger.info("✅ Cached document not modified.")
+            return db
+
+        try:
+            if document.content_hash != entry.content_hash:
+                changed = await run_in_stage("cache", load_vector_store, document.content_hash)
+                if changed is None:
+                    logger.info("🔄 Document changed since it was cached.")
+                    return await self._update(document_url, db, document)
+                db = changed
+            await run_in_stage(
+                "cache", record_url, document_url, db.content_hash, document.etag, document.last_modified
+            )
+            return db
+        finally:
+            os.remove(document.path)
+
+    async def _load_or_ingest(self, document_url: str):
+        # Another worker may have finished this document while we waited
+        db = await run_in_stage("cache", load_vector_store_if_exists, document_url)
+        if db is not None:
+            logger.info("✅ Using vector store ingested by a concurrent request.")
+            return db
+        return await self._ingest(document_url)
+
+    async def _ingest(self, document_url: str):
+        """Downloads the document and embeds it unless its content is already cached."""
+        with span("download"):
+            document = await download_document(document_url)
+        try:
+            # Same bytes may already be cached under a different URL
+            db = await run_in_stage("cache", load_vector_store, document.content_hash)
+            if db is not None:
+                logger.info("✅ Using cached vector store (same content, new URL).")
+                await run_in_stage(
+                    "cache", record_url, document_url, document.content_hash, document.etag, document.last_modified
+                )
+                return db
+
+            logger.info("📥 Embedding new document.")
+            index, documents, pages = await self._stream_embed(document)
+            return await self._save(document_url, document, index, documents, pages)
+        finally:
+            os.remove(document.path)
+
+    async def _update(self, document_url: str, old, document):
+        """Builds the store for a changed document, re-embedding only its changed pages."""
+        old_pages = await run_in_stage("cache", old.page_records)
+        if not old_pages:
+            # Cached before page hashes were recorded: nothing to diff against
+            index, documents, pages = await self._stream_embed(document)
+        else:
+            pages = []
+            with span("extract"):
+                texts = await run_in_stage("extract", read_pages, document.path, document.ext, pages)
+                old_documents = await run_in_stage("cache", old.all_documents)
+                plan = plan_page_update(old_pages, pages, old_documents)
+                fresh = await run_in_stage(
+                    "extract", rechunk_runs, texts, plan, pages, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT
+                )
+            logger.info(
+                "🔄 %d/%d pages changed: %d chunks kept, %d re-embedded",
+                len(plan.changed), len(pages), len(plan.kept), len(fresh),
+            )
+            with span("embed"):
+                index, documents = await run_in_stage("embed", self._merge_update, old, plan, fresh)
+            if not documents:
+                raise ValueError("No text could be extracted from the document")
+            logger.info("🗂️ Built %s", describe_index(index))
+        return await self._save(document_url, document, index, documents, pages)
+
+    async def _save(self, document_url: str, document, index, documents: list, pages: list):
+        ingested_chunks.inc(len(documents))
+        ingested_tokens.inc(sum(doc.metadata.get("tokens", 0) for doc in documents))
+        with span("save", chunks=len(documents)):
+            return await run_in_stage(
+                "cache", save_vector_store, index, documents, document_url, document.content_hash,
+                pages, document.etag, document.last_modified,
+            )
+
+    @staticmethod
+    def _merge_update(old, plan, fresh):
+        """Kept chunks (with their stored vectors when exact) + fresh chunks, in document order."""
+        kept_vectors = old.reconstruct([chunk_id for chunk_id, _, _ in plan.kept])
+        chunks = [
+            (span, text, None if kept_vectors is None else kept_vectors[i])
+            for i, (_, span, text) in enumerate(plan.kept)
+        ]
+        chunks += [(span, text, None) for span, text in fresh]
+        chunks.sort(key=lambda chunk: chunk[0].start)
+
+        embedder = ChunkEmbedder(capacity=len(chunks))
+        todo = [text for _, text, vector in chunks if vector is None]
+        encoded = iter(embedder.encode(todo) if todo else ())
+        if chunks:
+            vectors = np.vstack([next(encoded) if vector is None else vector for _, _, vector in chunks])
+            embedder.add([(span, text) for span, text, _ in chunks], vectors)
+        return embedder.build()
+
+    @staticmethod
+    async def _stream_embed(document):
+        """
+        Embeds chunk batches while later pages are still being parsed.
+        Returns (index, documents, page records).
+        """
+        embedder = ChunkEmbedder()
+        pages = []
+        batches = iterate_in_stage(
+            "extract", iter_chunk_batches, document.path, document.ext,
+            CHUNK_BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT, pages,
+        )
+        with span("extract_embed"):
+            async with aclosing(batches):
+                async for chunks in batches:
+                    with span("embed", chunks=len(chunks)):
+                        await run_in_stage("embed", embedder.add, chunks)
+        if not embedder.documents:
+            raise ValueError("No text could be extracted from the document")
+        logger.info(
+            "🧠 Embedding cache: %d/%d chunks reused (%.0f%% hit rate)",
+            embedder.cache_hits, len(embedder.documents), embedder.cache_hit_ratio * 100,
+        )
+        with span("index_build", chunks=len(embedder.documents)):
+            index, documents = await run_in_stage("embed", embedder.build)
+        logger.info("🗂️ Built %s", describe_index(index))
+        return index, documents, pages
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from app.helpers.concurrency import mark_background
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class IngestJob:
+    def __init__(self, url: str):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.status = "queued"
+        self.error = None
+        self.content_hash = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "content_hash": self.content_hash,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestQueue:
+    """
+    FIFO queue of background document ingests drained by a fixed pool of
+    worker tasks. Submissions are bounded by maxsize and rejected with
+    QueueFullError when it's reached. Query-time ingests don't go through
+    the queue, and workers run as background work so those ingests get
+    stage slots first (see BACKGROUND_LIMITS). Job state (not the ingested store) is kept in memory for the
+    last `history` jobs of this process.
+    """
+
+    def __init__(self, ingest_fn, workers: int, maxsize: int, history: int = 10000):
+        self.ingest_fn = ingest_fn
+        self.workers = workers
+        self.maxsize = maxsize
+        self.history = history
+        self.jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+        self._pending = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def submit(self, url: str) -> IngestJob:
+        """Enqueues a document; raises QueueFullError past maxsize pending jobs."""
+        if not self.running:
+            raise RuntimeError("Ingest queue is not running")
+        if self._pending >= self.maxsize:
+            raise QueueFullError(f"Ingest queue is full ({self.maxsize} pending jobs)")
+        job = IngestJob(url)
+        self._pending += 1
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        self._queue.put_nowait(job)
+        return job
+
+    def submit_many(self, urls: list) -> list:
+        """All-or-nothing submit: rejects the whole list if it doesn't fit."""
+        if self._pending + len(urls) > self.maxsize:
+            raise QueueFullError(f"Ingest queue is full ({self._pending}/{self.maxsize} pending jobs)")
+        return [self.submit(url) for url in urls]
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        statuses = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending": self._pending,
+            "maxsize": self.maxsize,
+            "jobs": statuses,
+        }
+
+    async def _worker(self, n: int):
+        mark_background()
+        while True:
+            job = await self._queue.get()
+            self._pending -= 1
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                # Only the hash is kept: the store itself lives in the caches
+                job.content_hash = getattr(await self.ingest_fn(job.url), "content_hash", None)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except Exception as e:
+                logger.error("❌ Ingest of %s failed: %s", job.url, e)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
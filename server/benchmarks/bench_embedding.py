@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Embedding throughput: the old per-batch FAISS.from_documents + merge_from
+path vs. the single-matrix engine in app.helpers.embedder.
+
+Run from server/:  python -m benchmarks.bench_embedding --chunks 2000
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.helpers.embedder import embed_chunks_parallel, get_embedding_model
+
+WORDS = (
+    "policy insured premium grace period hospitalisation claim benefit sum "
+    "exclusion waiting maternity coverage deductible nominee renewal cashless "
+    "network provider pre-existing disease room rent co-payment day care"
+).split()
+
+
+def make_chunks(n: int, words_per_chunk: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_chunk)) for _ in range(n)]
+
+
+def legacy_embed(chunks, batch_size: int = 50, num_threads: int = 4):
+    """The previous embed_chunks_parallel: one FAISS store per batch, then merge."""
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+    def create_batch_embeddings(batch_chunks):
+        docs = [Document(page_content=chunk) for chunk in batch_chunks]
+        return FAISS.from_documents(docs, get_embedding_model())
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        stores = list(executor.map(create_batch_embeddings, batches))
+    main_vs = stores[0]
+    for vs in stores[1:]:
+        main_vs.merge_from(vs)
+    return main_vs
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run(chunks: int, words: int, batch_sizes: list[int]):
+    data = make_chunks(chunks, words)
+    # Warm-up so model load / first-call overhead isn't billed to either path
+    embed_chunks_parallel(data[:32], use_cache=False)
+
+    print("=" * 50)
+    print(f"📊 EMBEDDING BENCHMARK ({chunks} chunks x {words} words)")
+    print("=" * 50)
+    elapsed = timed(legacy_embed, data)
+    print(f"   legacy (50/batch, 4 threads, merge): {chunks / elapsed:8.1f} chunks/sec")
+    results = {"legacy": chunks / elapsed}
+    for batch_size in batch_sizes:
+        elapsed = timed(embed_chunks_parallel, data, batch_size=batch_size, use_cache=False)
+        print(f"   single matrix (batch {batch_size:>4}):        {chunks / elapsed:8.1f} chunks/sec")
+        results[f"matrix_{batch_size}"] = chunks / elapsed
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 128, 256])
+    args = parser.parse_args()
+    run(args.chunks, args.words, args.batch_sizes)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Recall vs. latency of the ANN index types in app.helpers.index_factory,
+measured against the exact flat index.
+
+Run from server/:
+    python -m benchmarks.bench_index --n 200000
+    python -m benchmarks.bench_index --vectors vector_cache/embeddings/<model>/vectors.f32 --dim 384
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from app.helpers.index_factory import apply_search_params, build_index
+
+
+def load_vectors(path: str, dim: int) -> np.ndarray:
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r").astype("float32")
+    return np.fromfile(path, dtype="float32").reshape(-1, dim)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters: closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / truth.size
+
+
+def index_mb(index) -> float:
+    return faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+
+def time_search(index, queries: np.ndarray, k: int, repeats: int = 3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, ids = index.search(queries, k)
+        best = min(best, time.perf_counter() - start)
+    return ids, best * 1000 / len(queries)
+
+
+def run(vectors: np.ndarray, n_queries: int, k: int, ef_values, nprobe_values, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype("float32")
+
+    print("=" * 50)
+    print(f"📊 INDEX BENCHMARK ({len(vectors)} x {vectors.shape[1]}, {n_queries} queries, k={k})")
+    print("=" * 50)
+    results = []
+
+    start = time.perf_counter()
+    flat = build_index(vectors, "flat")
+    build_s = time.perf_counter() - start
+    truth, ms = time_search(flat, queries, k)
+    results.append({"index": "flat", "param": None, "build_s": build_s, "recall": 1.0,
+                    "ms_per_query": ms, "mb": index_mb(flat)})
+
+    for index_type, values, knob in (("hnsw", ef_values, "ef_search"), ("ivfpq", nprobe_values, "nprobe")):
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_s = time.perf_counter() - start
+        mb = index_mb(index)
+        for value in values:
+            apply_search_params(index, **{knob: value})
+            ids, ms = time_search(index, queries, k)
+            results.append({"index": index_type, "param": f"{knob}={value}", "build_s": build_s,
+                            "recall": recall_at_k(ids, truth), "ms_per_query": ms, "mb": mb})
+
+    print(f"   {'index':<7}{'param':<15}{'recall@' + str(k):>10}{'ms/query':>10}{'build s':>9}{'MB':>9}")
+    for r in results:
+        print(f"   {r['index']:<7}{r['param'] or '-':<15}{r['recall']:>10.3f}"
+              f"{r['ms_per_query']:>10.3f}{r['build_s']:>9.1f}{r['mb']:>9.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="raw float32 file (e.g. the embedding cache) or .npy")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--n", type=int, default=100000, help="synthetic corpus size if --vectors is not given")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    data = load_vectors(args.vectors, args.dim) if args.vectors else synthetic_vectors(args.n, args.dim)
+    results = run(np.ascontiguousarray(data), args.queries, args.k, args.ef, args.nprobe)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of POST /api/v1/hackrx/run, fully offline: generated
+PDF/DOCX/EML fixtures are served by a local HTTP server and Gemini is
+replaced by benchmarks.fake_gemini. The app runs in-process behind httpx's
+ASGI transport, with a fresh vector cache.
+
+Scenarios:
+  cold_ingest  every document once, sequentially, on an empty cache
+  warm_cache   the same requests again (vector + answer cache hits)
+  concurrent   --requests requests from --concurrency clients, cached
+               documents but new questions (retrieval + LLM every time)
+
+Each scenario reports requests/sec, latency percentiles, peak RSS and the
+per-stage timings from app.helpers.metrics. Results are written as JSON;
+--compare flags regressions against an earlier run (exit code 1).
+
+Run from server/:
+    python -m benchmarks.bench_pipeline --pages 20 --concurrency 8
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fixtures import FixtureServer, generate_fixtures, make_questions
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Relative change beyond --tolerance that counts as a regression; higher is better for req_per_s
+COMPARED = (("req_per_s", 1), ("latency_p95_s", -1), ("peak_rss_mb", -1))
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # No procfs: fall back to the process-wide peak (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    """Peak resident memory of this process while a scenario runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def stage_snapshot(metrics) -> dict:
+    with metrics.stage_seconds._lock:
+        return {key[0]: (state[1], state[2]) for key, state in metrics.stage_seconds._values.items()}
+
+
+def cache_snapshot(metrics) -> dict:
+    with metrics.cache_lookups._lock:
+        return dict(metrics.cache_lookups._values)
+
+
+def stage_delta(before: dict, after: dict) -> dict:
+    stages = {}
+    for stage, (total, count) in after.items():
+        prev_total, prev_count = before.get(stage, (0.0, 0))
+        if count > prev_count:
+            n = count - prev_count
+            stages[stage] = {"count": n, "total_s": total - prev_total, "mean_ms": 1000 * (total - prev_total) / n}
+    return stages
+
+
+def cache_delta(before: dict, after: dict) -> dict:
+    caches = {}
+    for (cache, result), value in after.items():
+        counts = caches.setdefault(cache, {"hit": 0, "miss": 0})
+        counts[result] += value - before.get((cache, result), 0)
+    return {
+        cache: {**counts, "hit_ratio": counts["hit"] / (counts["hit"] + counts["miss"])}
+        for cache, counts in caches.items()
+        if counts["hit"] + counts["miss"]
+    }
+
+
+async def run_scenario(name: str, client, jobs: list, concurrency: int) -> dict:
+    from app.helpers import metrics
+    from app.helpers.llm_reasoner import FAILED_ANSWER
+    from benchmarks.fake_gemini import FakeGenerativeModel
+
+    stages_before, caches_before = stage_snapshot(metrics), cache_snapshot(metrics)
+    llm_calls_before = FakeGenerativeModel.calls
+    latencies, errors, failed_answers = [], 0, 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(url: str, questions: list):
+        nonlocal errors, failed_answers
+        async with limit:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/hackrx/run", json={"documents": url, "questions": questions})
+            latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+            return
+        failed_answers += sum(answer == FAILED_ANSWER for answer in response.json()["answers"])
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(url, questions) for url, questions in jobs))
+        wall = time.perf_counter() - start
+
+    result = {
+        "requests": len(jobs),
+        "concurrency": concurrency,
+        "errors": errors,
+        "failed_answers": failed_answers,
+        "wall_s": wall,
+        "req_per_s": len(jobs) / wall if wall else 0.0,
+        "latency_p50_s": percentile(latencies, 0.50),
+        "latency_p95_s": percentile(latencies, 0.95),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "latency_max_s": max(latencies, default=0.0),
+        "peak_rss_mb": rss.peak_mb,
+        "llm_calls": FakeGenerativeModel.calls - llm_calls_before,
+        "stages": stage_delta(stages_before, stage_snapshot(metrics)),
+        "caches": cache_delta(caches_before, cache_snapshot(metrics)),
+    }
+    print_scenario(name, result)
+    return result
+
+
+def print_scenario(name: str, r: dict):
+    print(f"\n▶️  {name}: {r['requests']} requests, concurrency {r['concurrency']}")
+    print(f"   {r['req_per_s']:.2f} req/s | p50 {r['latency_p50_s']:.3f}s  p95 {r['latency_p95_s']:.3f}s  "
+          f"p99 {r['latency_p99_s']:.3f}s | peak RSS {r['peak_rss_mb']:.0f} MB")
+    print(f"   errors {r['errors']}, failed answers {r['failed_answers']}, LLM calls {r['llm_calls']}")
+    for stage, s in sorted(r["stages"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"   {stage:<15}{s['count']:>6} x {s['mean_ms']:>9.1f} ms  = {s['total_s']:>8.2f} s")
+    for cache, c in sorted(r["caches"].items()):
+        print(f"   cache {cache:<13}{c['hit_ratio']:>6.0%} hit ({c['hit']}/{c['hit'] + c['miss']})")
+
+
+async def run_scenarios(args, server, names: list) -> dict:
+    import httpx
+    from app.main import app
+
+    urls = [server.url(name) for name in names]
+    questions = make_questions(args.questions)
+    concurrent_jobs = [
+        (urls[i % len(urls)], make_questions(args.questions, seed=1000 + i)) for i in range(args.requests)
+    ]
+    # The ASGI transport doesn't run lifespan events (ingest workers, pools)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return {
+                "cold_ingest": await run_scenario("cold_ingest", client, [(u, questions) for u in urls], 1),
+                "warm_cache": await run_scenario("warm_cache", client, [(u, questions) for u in urls], 1),
+                "concurrent": await run_scenario("concurrent", client, concurrent_jobs, args.concurrency),
+            }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints metric changes vs. baseline; returns the regressions."""
+    regressions = []
+    print("\n" + "=" * 50)
+    print(f"📈 COMPARISON vs {baseline.get('git_commit') or 'baseline'} ({baseline.get('timestamp')})")
+    print("=" * 50)
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        print(f"   {name}")
+        for metric, direction in COMPARED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = direction * change < -tolerance
+            flag = "❌" if regressed else "  "
+            print(f"   {flag} {metric:<15}{old:>10.3f} -> {new:>10.3f}  ({change:+.0%})")
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main(args) -> int:
+    # Configure the app before anything imports it
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["VECTOR_CACHE_DIR"] = args.cache_dir or tempfile.mkdtemp(prefix="bench_cache_")
+    fixtures_dir = args.fixtures_dir or tempfile.mkdtemp(prefix="bench_fixtures_")
+
+    names = generate_fixtures(fixtures_dir, args.formats, args.docs, args.pages, args.words_per_page)
+
+    from benchmarks import fake_gemini
+
+    # One INFO line per ASGI request would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_gemini.install(
+        latency=args.llm_latency, error_rate=args.llm_error_rate,
+        invalid_rate=args.llm_invalid_rate, drop_rate=args.llm_drop_rate,
+    )
+
+    print("=" * 50)
+    print(f"📊 PIPELINE BENCHMARK ({len(names)} documents x {args.pages} pages, {args.questions} questions)")
+    print("=" * 50)
+    with FixtureServer(fixtures_dir) as server:
+        scenarios = asyncio.run(run_scenarios(args, server, names))
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "config": vars(args),
+        "scenarios": scenarios,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx", "eml"], choices=["pdf", "docx", "eml"])
+    parser.add_argument("--docs", type=int, default=2, help="documents per format")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=10, help="questions per request")
+    parser.add_argument("--requests", type=int, default=32, help="requests in the concurrent scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean fake Gemini latency (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.02, help="share of calls failing with 429")
+    parser.add_argument("--llm-invalid-rate", type=float, default=0.0, help="share of malformed JSON responses")
+    parser.add_argument("--llm-drop-rate", type=float, default=0.0, help="share of answers missing from responses")
+    parser.add_argument("--cache-dir", help="vector cache directory (default: a fresh temp dir)")
+    parser.add_argument("--fixtures-dir", help="where fixtures are generated and served from")
+    parser.add_argument("--out", help="results JSON (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change counted as a regression")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long `import app.main` takes in a fresh
+interpreter, which modules dominate it (-X importtime), and how long a
+uvicorn worker takes from launch until GET /ready returns 200.
+
+Run from server/:
+    python -m benchmarks.bench_startup --runs 5 --top 15
+    python -m benchmarks.bench_startup --preload --out benchmarks/results/startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def app_env(preload: bool) -> dict:
+    env = dict(os.environ)
+    env.setdefault("ALLOWED_ORIGINS", "*")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env.setdefault("VECTOR_CACHE_DIR", tempfile.mkdtemp(prefix="bench_startup_"))
+    env["PRELOAD_MODELS"] = "1" if preload else "0"
+    return env
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env: dict, top: int) -> list:
+    """Slowest third-party/stdlib packages by cumulative import time."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        root = name.split(".")[0]
+        # The outermost import of a package has the largest cumulative time
+        # and already includes its submodules; app itself is the total
+        if root != "app":
+            packages[root] = max(packages.get(root, 0), int(cumulative) / 1e6)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_ready(env: dict, timeout: float) -> dict:
+    """Launches uvicorn and polls /ready; returns wall-clock seconds and the probe body."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    listening = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1.0)
+            except httpx.TransportError:
+                time.sleep(0.05)
+                continue
+            listening = listening or time.perf_counter() - start
+            if response.status_code == 200:
+                return {
+                    "listening_s": round(listening, 3),
+                    "ready_s": round(time.perf_counter() - start, 3),
+                    "probe": response.json(),
+                }
+            time.sleep(0.05)
+        raise TimeoutError(f"/ready not 200 after {timeout:.0f}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(args) -> int:
+    env = app_env(args.preload)
+    print("=" * 50)
+    print(f"🚀 STARTUP BENCHMARK ({args.runs} runs, preload={'on' if args.preload else 'off'})")
+    print("=" * 50)
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    print(f"\n📦 import app.main: median {statistics.median(imports):.2f}s, "
+          f"min {min(imports):.2f}s, max {max(imports):.2f}s")
+
+    slowest = top_imports(env, args.top) if args.top else []
+    for name, seconds in slowest:
+        print(f"   {name:30s} {seconds * 1000:8.1f} ms")
+
+    readiness = [measure_ready(env, args.timeout) for _ in range(args.runs)]
+    ready = [r["ready_s"] for r in readiness]
+    listening = [r["listening_s"] for r in readiness]
+    print(f"\n🟢 launch -> listening: median {statistics.median(listening):.2f}s")
+    print(f"🟢 launch -> /ready 200: median {statistics.median(ready):.2f}s, "
+          f"min {min(ready):.2f}s, max {max(ready):.2f}s")
+    probe = readiness[-1]["probe"]
+    print(f"   in-process: import {probe['import_seconds']}s, warm-up {probe['warmup_seconds']}s, "
+          f"ready {probe['time_to_ready_seconds']}s")
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "import_s": imports,
+        "slowest_imports": slowest,
+        "readiness": readiness,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="slowest imported packages to list (0: skip)")
+    parser.add_argument("--preload", action="store_true", help="start with PRELOAD_MODELS=1")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for /ready")
+    parser.add_argument("--out", help="results JSON (default: benchmarks/results/startup-<time>.json)")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Stand-in for google.generativeai.GenerativeModel with configurable latency
+and failure rates, so load tests exercise batching, retries and the rate
+limiter without calling Gemini.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+
+QUESTION_RE = re.compile(r"^Question (\d+):$", re.MULTILINE)
+
+
+class FakeRateLimitError(Exception):
+    """Looks like a 429 to app.helpers.llm_scheduler.is_retryable."""
+
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    latency: mean seconds per call (lognormal, so there is a tail)
+    error_rate: share of calls raising a retryable 429
+    invalid_rate: share of calls returning malformed JSON
+    drop_rate: share of answers left out of an otherwise valid response
+    """
+
+    latency = 0.5
+    error_rate = 0.0
+    invalid_rate = 0.0
+    drop_rate = 0.0
+    seed = 0
+    calls = 0
+
+    def __init__(self, model_name: str = None, *args, **kwargs):
+        self.model_name = model_name
+        self.rng = random.Random(self.seed)
+
+    def _delay(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        # lognormal(0, sigma) has mean exp(sigma^2 / 2); rescale it to `latency`
+        sigma = 0.5
+        return self.rng.lognormvariate(0, sigma) * self.latency / math.exp(sigma ** 2 / 2)
+
+    def _respond(self, prompt: str) -> FakeResponse:
+        type(self).calls += 1
+        if self.rng.random() < self.error_rate:
+            raise FakeRateLimitError("429 Resource has been exhausted (fake)")
+        if self.rng.random() < self.invalid_rate:
+            return FakeResponse('{"answers": [')
+        numbers = [int(n) for n in QUESTION_RE.findall(prompt)]
+        answers = [
+            {"question": n, "answer": f"Synthetic answer {n} ({len(prompt)} prompt chars)."}
+            for n in numbers
+            if self.rng.random() >= self.drop_rate
+        ]
+        return FakeResponse(json.dumps({"answers": answers}))
+
+    async def generate_content_async(self, prompt: str, **kwargs) -> FakeResponse:
+        await asyncio.sleep(self._delay())
+        return self._respond(prompt)
+
+    def generate_content(self, prompt: str, **kwargs) -> FakeResponse:
+        time.sleep(self._delay())
+        return self._respond(prompt)
+
+
+def install(latency: float = 0.5, error_rate: float = 0.0, invalid_rate: float = 0.0,
+            drop_rate: float = 0.0, seed: int = 0):
+    """Replaces genai.GenerativeModel (and any model already created) with the fake."""
+    import google.generativeai as genai
+
+    FakeGenerativeModel.latency = latency
+    FakeGenerativeModel.error_rate = error_rate
+    FakeGenerativeModel.invalid_rate = invalid_rate
+    FakeGenerativeModel.drop_rate = drop_rate
+    FakeGenerativeModel.seed = seed
+    FakeGenerativeModel.calls = 0
+    genai.GenerativeModel = FakeGenerativeModel
+
+    from app.helpers import llm_reasoner
+
+    llm_reasoner._model = FakeGenerativeModel(llm_reasoner.MODEL_NAME)
@@ -0,0 +1,122 @@
+"""
+Synthetic policy documents and a local HTTP server for them, so benchmarks
+never depend on a remote document host.
+"""
+import os
+import random
+import threading
+from email.message import EmailMessage
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import docx
+import fitz
+
+WORDS = (
+    "policy insured premium grace period hospitalisation claim benefit sum "
+    "exclusion waiting maternity coverage deductible nominee renewal cashless "
+    "network provider pre-existing disease room rent co-payment day care "
+    "ambulance organ donor ayush treatment domiciliary cataract surgery "
+    "discount no-claim bonus health check-up portability migration"
+).split()
+
+QUESTION_TEMPLATES = (
+    "What is the {} for {}?",
+    "Does the policy cover {} under {}?",
+    "What are the conditions for {} and {}?",
+    "Is there a waiting period for {} related to {}?",
+    "How is {} calculated for {}?",
+)
+
+
+def make_paragraphs(n_words: int, rng: random.Random, words_per_paragraph: int = 80) -> list[str]:
+    paragraphs = []
+    while n_words > 0:
+        size = min(n_words, words_per_paragraph)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(size))
+        paragraphs.append(sentence[0].upper() + sentence[1:] + ".")
+        n_words -= size
+    return paragraphs
+
+
+def make_questions(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(QUESTION_TEMPLATES).format(rng.choice(WORDS), rng.choice(WORDS)) for _ in range(n)]
+
+
+def write_pdf(path: str, pages: int, words_per_page: int, seed: int = 0):
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for _ in range(pages):
+            page = doc.new_page()
+            text = "\n".join(make_paragraphs(words_per_page, rng))
+            page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36), text, fontsize=7)
+        doc.save(path)
+
+
+def write_docx(path: str, pages: int, words_per_page: int, seed: int = 0):
+    rng = random.Random(seed)
+    document = docx.Document()
+    for _ in range(pages):
+        for paragraph in make_paragraphs(words_per_page, rng):
+            document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_eml(path: str, pages: int, words_per_page: int, seed: int = 0):
+    rng = random.Random(seed)
+    message = EmailMessage()
+    message["Subject"] = "Policy wording"
+    message["From"] = "insurer@example.com"
+    message["To"] = "customer@example.com"
+    body = "".join(f"<p>{p}</p>" for p in make_paragraphs(pages * words_per_page, rng))
+    message.set_content(f"<html><body>{body}</body></html>", subtype="html")
+    with open(path, "wb") as f:
+        f.write(bytes(message))
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "eml": write_eml}
+
+
+def generate_fixtures(directory: str, formats, count: int, pages: int, words_per_page: int) -> list[str]:
+    """Writes `count` documents per format; returns their file names."""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for ext in formats:
+        for i in range(count):
+            name = f"doc_{i}_{pages}p.{ext}"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                WRITERS[ext](path, pages, words_per_page, seed=i)
+            names.append(name)
+    return names
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    # Sends Last-Modified and answers If-Modified-Since with 304
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Serves a directory on 127.0.0.1 from a background thread."""
+
+    def __init__(self, directory: str, port: int = 0):
+        handler = partial(_QuietHandler, directory=directory)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
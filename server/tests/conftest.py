@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app package the way run.py does, from server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.helpers import processor  # noqa: E402
+
+
+def fake_word_tokens(word: str) -> int:
+    return 1 + len(word) // 4
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    """Counts tokens without downloading the bge tokenizer."""
+    monkeypatch.setattr(processor, "count_word_tokens", fake_word_tokens)
+
+
+def make_pages(word_counts: dict, tag: str = "") -> dict:
+    """{page: text} with words unique across the document, a few per line."""
+    pages = {}
+    for page, count in word_counts.items():
+        words = [f"p{page}{tag}w{i}" for i in range(count)]
+        pages[page] = "\n".join(" ".join(words[i:i + 7]) for i in range(0, count, 7))
+    return pages
+
+
+def document_text(pages: dict) -> str:
+    """The text ChunkSpan offsets point into: pages joined by newlines."""
+    return "".join(text + "\n" for text in pages.values())
+
+
+def assert_chunks_cover(full_text: str, chunks: list, max_repeat: int = 2):
+    """
+    Every chunk's text is its slice of the document, every word is in some
+    chunk, and overlap never puts a word in more than max_repeat chunks.
+    """
+    words = {m.start(): m.group() for m in processor.WORD_RE.finditer(full_text)}
+    seen = {}
+    for span, text in chunks:
+        assert full_text[span.start:span.end] == text
+        for m in processor.WORD_RE.finditer(text):
+            start = span.start + m.start()
+            assert words.get(start) == m.group()
+            seen[start] = seen.get(start, 0) + 1
+    assert seen.keys() == words.keys()
+    assert max(seen.values(), default=0) <= max_repeat
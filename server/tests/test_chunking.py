@@ -0,0 +1,42 @@
+import pytest
+
+from app.helpers.processor import iter_chunk_spans
+from conftest import assert_chunks_cover, document_text, fake_word_tokens, make_pages
+
+
+@pytest.mark.parametrize("chunk_size, overlap, unit", [
+    (200, 50, "words"),
+    (20, 5, "words"),
+    (10, 0, "words"),
+    (40, 10, "tokens"),
+])
+@pytest.mark.parametrize("word_counts", [
+    {1: 500},
+    {1: 30, 2: 0, 3: 3, 4: 250},
+    {1: 1},
+])
+def test_chunk_spans_cover_document(word_counts, chunk_size, overlap, unit):
+    pages = make_pages(word_counts)
+    chunks = list(iter_chunk_spans(pages.items(), chunk_size, overlap, unit))
+    assert_chunks_cover(document_text(pages), chunks)
+
+    starts = [span.start for span, _ in chunks]
+    ends = [span.end for span, _ in chunks]
+    # Document order, and no chunk inside another
+    assert starts == sorted(set(starts)) and ends == sorted(set(ends))
+    for span, text in chunks:
+        weights = [fake_word_tokens(w) if unit == "tokens" else 1 for w in text.split()]
+        assert sum(weights) <= chunk_size
+        if unit == "tokens":
+            assert span.tokens == sum(weights)
+        assert text.split()[0].startswith(f"p{span.page}w")
+        assert text.split()[-1].startswith(f"p{span.end_page}w")
+
+
+def test_empty_document_has_no_chunks():
+    assert list(iter_chunk_spans(make_pages({1: 0, 2: 0}).items())) == []
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        list(iter_chunk_spans(make_pages({1: 5}).items(), chunk_size=10, overlap=10))
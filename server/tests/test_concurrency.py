@@ -0,0 +1,33 @@
+import asyncio
+
+from app.helpers import concurrency
+from app.helpers.concurrency import BACKGROUND_LIMITS, STAGE_LIMITS, mark_background, stage_limit
+
+
+def test_background_work_leaves_stage_slots_for_queries():
+    async def scenario():
+        release = asyncio.Event()
+        holding = {"background": 0, "query": 0}
+
+        async def hold(kind):
+            if kind == "background":
+                mark_background()
+            async with stage_limit("embed"):
+                holding[kind] += 1
+                await release.wait()
+                holding[kind] -= 1
+
+        background = [asyncio.create_task(hold("background")) for _ in range(2 * STAGE_LIMITS["embed"])]
+        await asyncio.sleep(0.01)
+        assert holding["background"] == BACKGROUND_LIMITS["embed"]
+
+        # Queued after every background job, yet served right away
+        query = asyncio.create_task(hold("query"))
+        await asyncio.sleep(0.01)
+        assert holding["query"] == 1
+
+        release.set()
+        await asyncio.gather(query, *background)
+
+    asyncio.run(scenario())
+    concurrency.shutdown_executors()
@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.helpers.page_diff import plan_page_update, rechunk_runs
+from app.helpers.processor import iter_chunk_spans, record_pages
+from conftest import assert_chunks_cover, document_text, make_pages
+
+CHUNK_SIZE, OVERLAP = 50, 12
+
+
+def ingest(pages: dict):
+    """Page records and stored documents, as a full ingest would produce them."""
+    records = []
+    spans = iter_chunk_spans(record_pages(pages.items(), records), CHUNK_SIZE, OVERLAP)
+    documents = [
+        Document(page_content=text, metadata={
+            "chunk_id": i, "start": span.start, "end": span.end,
+            "page": span.page, "end_page": span.end_page, "tokens": span.tokens,
+        })
+        for i, (span, text) in enumerate(spans)
+    ]
+    return records, documents
+
+
+def update(old_pages: dict, new_pages: dict):
+    old_records, old_documents = ingest(old_pages)
+    new_records = []
+    list(record_pages(new_pages.items(), new_records))
+    plan = plan_page_update(old_records, new_records, old_documents)
+    fresh = rechunk_runs(new_pages, plan, new_records, CHUNK_SIZE, OVERLAP)
+    chunks = sorted(
+        [(span, text) for _, span, text in plan.kept] + fresh,
+        key=lambda chunk: chunk[0].start,
+    )
+    assert_chunks_cover(document_text(new_pages), chunks)
+    return plan, fresh
+
+
+OLD = make_pages({1: 120, 2: 90, 3: 150, 4: 60})
+
+
+def test_edit_one_page():
+    new = dict(OLD)
+    new[2] = make_pages({2: 95}, tag="x")[2]
+    plan, fresh = update(OLD, new)
+    assert plan.changed == [2]
+    # Chunks on pages 1, 3 and 4 away from page 2 survive
+    assert {span.page for _, span, _ in plan.kept} >= {1, 3, 4}
+    assert all(span.end_page < 2 or span.page > 2 for _, span, _ in plan.kept)
+
+
+def test_append_page():
+    new = dict(OLD)
+    new[5] = make_pages({5: 80})[5]
+    plan, fresh = update(OLD, new)
+    assert plan.changed == [5]
+    assert all(span.start >= plan.kept[-1][1].start for span, _ in fresh)
+
+
+def test_remove_trailing_pages():
+    new = {p: OLD[p] for p in (1, 2)}
+    plan, _ = update(OLD, new)
+    assert plan.changed == [3, 4]
+    assert all(span.end_page <= 2 for _, span, _ in plan.kept)
+
+
+@pytest.mark.parametrize("page", [1, 3, 4])
+def test_empty_page(page):
+    new = dict(OLD)
+    new[page] = ""
+    plan, _ = update(OLD, new)
+    assert plan.changed == [page]
+
+
+def test_unchanged_document_keeps_every_chunk():
+    _, documents = ingest(OLD)
+    plan, fresh = update(OLD, dict(OLD))
+    assert plan.changed == [] and fresh == []
+    assert [chunk_id for chunk_id, _, _ in plan.kept] == [d.metadata["chunk_id"] for d in documents]